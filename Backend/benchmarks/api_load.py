@@ -0,0 +1,218 @@
+"""Load-test the API at growing user counts and write a JSON report to diff between releases.
+
+Run from Backend/:  python -m benchmarks.api_load --scales 1000,10000,100000 --out benchmark-report.json
+Synthetic mothers, with ids from generate_unique_identifier, are seeded straight into the
+store. One dataset grows from each scale to the next, and every endpoint is timed at each
+scale. The app runs in-process on a temporary SQLite file by default. --base-url sends the
+requests to a running server instead; seed the datastore that server uses with
+--store firestore (set FIRESTORE_EMULATOR_HOST for the emulator) or a shared CARIYA_SQLITE_PATH.
+Needs httpx (pip install httpx).
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+from benchmarks.concurrent_deposits import percentile
+
+FIRST_NAMES = ["Aisha", "Grace", "Sarah", "Esther", "Ruth", "Mary", "Agnes", "Florence", "Harriet", "Joyce"]
+SURNAMES = ["Nakato", "Namusoke", "Achieng", "Nabirye", "Akello", "Nansubuga", "Auma", "Kyomuhendo"]
+REGISTER_BASE = 90_000_000  # Mobile number suffixes for users registered during the run, clear of seeded ones
+SCORING_TIMEOUT = 3600
+
+
+def synthetic_mother(index):
+    """Return the registration fields of the index-th synthetic mother (the same on every run)."""
+    rng = random.Random(index)
+    num_children = rng.randint(1, 5)
+    return {
+        "first_name": rng.choice(FIRST_NAMES),
+        "surname": rng.choice(SURNAMES),
+        "mobile_number": f"+2567{index:08d}",
+        "num_children": num_children,
+        "ages_of_children_per_birth_order": "/".join(str(rng.randint(0, 17)) for _ in range(num_children))
+    }
+
+
+def seed_users(store, start, stop, batch_size=500):
+    """Register mothers start..stop-1 directly in the store; return their (user_id, mobile_number) pairs."""
+    from utils.helpers import build_user_document
+    from utils.segments import segment_state, record_segment_changes
+    from utils.counters import counter_changes, record_counters
+    from utils.storage import MOBILE_INDEX
+    from utils.unique_identifier_funcs import generate_unique_identifier, parse_children_ages
+
+    seeded = []
+    for chunk_start in range(start, stop, batch_size):
+        batch, changes = store.batch(), []
+        for index in range(chunk_start, min(stop, chunk_start + batch_size)):
+            mother = synthetic_mother(index)
+            user_id = generate_unique_identifier(
+                mother['first_name'], mother['surname'], mother['mobile_number'],
+                mother['num_children'], mother['ages_of_children_per_birth_order']
+            )
+            user = build_user_document(
+                mother['first_name'], mother['surname'], mother['mobile_number'], mother['num_children'],
+                parse_children_ages(mother['ages_of_children_per_birth_order']), user_id
+            )
+            batch.create_user(user_id, user)
+            batch.set_doc(MOBILE_INDEX, mother['mobile_number'], {'user_id': user_id})
+            changes.append((None, segment_state(user)))
+            seeded.append((user_id, mother['mobile_number']))
+        record_segment_changes(batch, changes)
+        record_counters(batch, counter_changes(mothers=len(changes)))
+        batch.commit()
+    return seeded
+
+
+async def measure(requests, concurrency, send):
+    """Await send(i) for i in range(requests), at most concurrency at a time; return throughput and latency percentiles."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one(i):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            response = await send(i)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": requests,
+        "errors": errors,
+        "throughput_rps": round(requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2)
+    }
+
+
+async def run_scale(client, seeded, requests, concurrency, register_start):
+    """Time every endpoint against the seeded users; return {endpoint: stats}."""
+    from utils.periods import current_month_key, parse_month_key
+
+    year, month = parse_month_key(current_month_key())
+    rng = random.Random(len(seeded))
+    sample = [rng.choice(seeded) for _ in range(requests)]
+    cursors = sorted(user_id for user_id, _ in seeded)
+
+    def register(i):
+        return client.post("/register", json=synthetic_mother(register_start + i))
+
+    endpoints = {
+        "register": register,
+        "login": lambda i: client.post("/login", json={"mobile_number": sample[i][1], "password": "bench"}),
+        "get_user": lambda i: client.get(f"/users/{sample[i][0]}"),
+        "add_savings": lambda i: client.post(f"/users/{sample[i][0]}/savings", params={"amount": 500.0}),
+        "add_activity": lambda i: client.post(f"/users/{sample[i][0]}/activities", json={
+            "activity": "Antenatal visit", "partner": "Health centre", "month": month, "year": year
+        }),
+        "donor_view": lambda i: client.get("/donor-view", params={"limit": 50, "start_after": rng.choice(cursors)}),
+    }
+    results = {}
+    for name, send in endpoints.items():
+        results[name] = await measure(requests, concurrency, send)
+    return results
+
+
+async def run_scoring(client):
+    """Queue /calculate-scores and poll the job to completion; return its timing."""
+    started = time.perf_counter()
+    job = (await client.post("/calculate-scores")).json()
+    while True:
+        status = (await client.get(f"/jobs/{job['job_id']}")).json()
+        if status['status'] not in ("queued", "running"):
+            break
+        if time.perf_counter() - started > SCORING_TIMEOUT:
+            raise RuntimeError(f"Scoring job {job['job_id']} did not finish in {SCORING_TIMEOUT}s")
+        await asyncio.sleep(0.2)
+    return {
+        "status": status['status'],
+        "users_processed": status['users_processed'],
+        "elapsed_seconds": round(time.perf_counter() - started, 3),
+        "users_per_second": status.get('users_per_second')
+    }
+
+
+async def run(store, client, scales, requests, concurrency):
+    report, seeded = [], []
+    for scale_index, users in enumerate(scales):
+        started = time.perf_counter()
+        seeded += seed_users(store, len(seeded), users)
+        seed_seconds = time.perf_counter() - started
+
+        endpoints = await run_scale(client, seeded, requests, concurrency, REGISTER_BASE + scale_index * requests)
+        report.append({
+            "users": users,
+            "seed_seconds": round(seed_seconds, 3),
+            "endpoints": endpoints,
+            "calculate_scores": await run_scoring(client)
+        })
+        print(f"{users} users: " + ", ".join(f"{name} p50={stats['p50_ms']}ms" for name, stats in endpoints.items()))
+    return report
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", default="1000,10000,100000", help="Comma-separated user counts, ascending")
+    parser.add_argument("--requests", type=int, default=500, help="Requests per endpoint at each scale")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--base-url", default=None, help="Benchmark a running server instead of the in-process app")
+    parser.add_argument("--store", default="sqlite", choices=["sqlite", "firestore"])
+    parser.add_argument("--out", default="benchmark-report.json")
+    args = parser.parse_args()
+    scales = sorted(int(scale) for scale in args.scales.split(","))
+
+    import httpx
+
+    if args.base_url is None:
+        # The app builds its store from the environment on first use, so configure it first
+        os.environ.setdefault("CARIYA_STORE", args.store)
+        if args.store == "sqlite":
+            os.environ.setdefault("CARIYA_SQLITE_PATH", os.path.join(tempfile.mkdtemp(), "bench.db"))
+        import main as api
+
+        store = api.get_store()
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=api.app), base_url="http://bench", timeout=None)
+    else:
+        from utils.storage import create_store
+
+        store = create_store(args.store)
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=None)
+
+    async def go():
+        async with client:
+            return await run(store, client, scales, args.requests, args.concurrency)
+
+    report = {
+        "generated_at": datetime.now().isoformat(),
+        "git_commit": git_commit(),
+        "target": args.base_url or "in-process",
+        "store": args.store,
+        "requests_per_endpoint": args.requests,
+        "concurrency": args.concurrency,
+        "scales": asyncio.run(go())
+    }
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Fire N parallel deposits at one user and check that no installment is lost.
+
+Run from Backend/:  python -m benchmarks.concurrent_deposits --deposits 500 --concurrency 32
+Uses the SQLite stand-in unless --store firestore is given (CARIYA_FIREBASE_CREDENTIALS applies).
+"""
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from utils.storage import create_store, MONTHLY_SAVINGS, SUMMARY
+from utils.summary import record_savings
+from utils.periods import current_month_key
+
+BENCH_USER_ID = "BENCH0000000000"
+
+
+def percentile(samples, pct):
+    """Return the pct-th percentile (nearest rank) of a list of samples."""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))]
+
+
+def run(store, deposits, concurrency, amount):
+    month_key = current_month_key()
+    store.create_user(BENCH_USER_ID, {
+        "first_name": "Bench",
+        "surname": "User",
+        "mobile_number": "+256000000000",
+        "num_children": 2,
+        "savings": 0.0,
+        "activity_points": 0,
+        "milestone_score": 0,
+        "compliance_score": 0,
+        SUMMARY: {}
+    })
+    store.set_month(BENCH_USER_ID, MONTHLY_SAVINGS, month_key, {'savings': 0.0, 'milestone_score': 0})
+
+    def deposit(_):
+        started = time.perf_counter()
+        user = store.get_user(BENCH_USER_ID)
+        record_savings(store, BENCH_USER_ID, user, month_key, amount, month_key)
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(deposit, range(deposits)))
+    elapsed = time.perf_counter() - started
+
+    expected = deposits * amount
+    user = store.get_user(BENCH_USER_ID)
+    month = store.get_month(BENCH_USER_ID, MONTHLY_SAVINGS, month_key)
+    assert month['savings'] == expected, f"monthly savings {month['savings']} != {expected}"
+    assert user['savings'] == expected, f"total savings {user['savings']} != {expected}"
+    assert user[SUMMARY][month_key]['savings'] == expected, "summary savings drifted"
+
+    return {
+        "deposits": deposits,
+        "concurrency": concurrency,
+        "elapsed_seconds": round(elapsed, 3),
+        "deposits_per_second": round(deposits / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "final_savings": user['savings']
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--store", default="sqlite", choices=["sqlite", "firestore"])
+    parser.add_argument("--deposits", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--amount", type=float, default=500.0)
+    args = parser.parse_args()
+    print(run(create_store(args.store), args.deposits, args.concurrency, args.amount))
+
+
+if __name__ == "__main__":
+    main()
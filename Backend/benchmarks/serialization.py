@@ -0,0 +1,95 @@
+"""Compare encode time and size of donor-view payloads: FastAPI's default JSON path against utils.responses.
+
+Run from Backend/:  python -m benchmarks.serialization --users 10000
+Builds a donor-view page of synthetic mothers with a year of monthly savings each, then
+encodes it three ways:
+  default   jsonable_encoder + JSONResponse, what a handler returning a dict used to cost
+  rows      dumps() of the same rows (orjson when installed)
+  columnar  dumps() of columnar_donor_view()
+For each, it reports the best encode time and the raw, gzip and (when the brotli package
+is installed) brotli sizes and compression times at the levels CompressionMiddleware uses.
+"""
+import argparse
+import gzip
+import random
+import time
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from benchmarks.api_load import synthetic_mother
+from utils.periods import add_months, current_month_key
+from utils.responses import dumps, columnar_donor_view, orjson, brotli, GZIP_LEVEL, BROTLI_QUALITY
+
+
+def build_page(users, months):
+    """Return a donor-view page (the /donor-view rows shape) of synthetic mothers."""
+    month_keys = [add_months(current_month_key(), -offset) for offset in range(months - 1, -1, -1)]
+    rows = []
+    for index in range(users):
+        rng = random.Random(index)
+        mother = synthetic_mother(index)
+        monthly_data = {}
+        for month_key in month_keys:
+            if rng.random() < 0.8:  # Some months have no savings
+                user_savings = float(rng.randrange(0, 6000, 500))
+                monthly_data[month_key] = {
+                    "user_savings": user_savings,
+                    "donor_contribution": user_savings if rng.random() < 0.6 else 0.0
+                }
+        total_user_savings = sum(month['user_savings'] for month in monthly_data.values())
+        total_donor_contributions = sum(month['donor_contribution'] for month in monthly_data.values())
+        rows.append({
+            "user_id": f"{mother['first_name'][0]}{mother['surname'][0]}{mother['mobile_number'][4:]}{mother['num_children']}",
+            "first_name": mother['first_name'],
+            "surname": mother['surname'],
+            "total_savings": total_user_savings + total_donor_contributions,
+            "total_user_savings": total_user_savings,
+            "total_donor_contributions": total_donor_contributions,
+            "monthly_data": monthly_data
+        })
+    return {"donor_view": rows, "next_cursor": rows[-1]['user_id'] if rows else None, "last_event_id": "0-0"}
+
+
+def best_of(repeats, func, *args):
+    """Return (result, best seconds) of calling func repeatedly."""
+    best = None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def measure(encode, page, repeats):
+    body, encode_seconds = best_of(repeats, encode, page)
+    gzipped, gzip_seconds = best_of(repeats, gzip.compress, body, GZIP_LEVEL)
+    result = {
+        "encode_ms": round(encode_seconds * 1000, 1),
+        "bytes": len(body),
+        "gzip_bytes": len(gzipped),
+        "gzip_ms": round(gzip_seconds * 1000, 1)
+    }
+    if brotli is not None:
+        compressed, brotli_seconds = best_of(repeats, lambda data: brotli.compress(data, quality=BROTLI_QUALITY), body)
+        result.update({"brotli_bytes": len(compressed), "brotli_ms": round(brotli_seconds * 1000, 1)})
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--months", type=int, default=12)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    page = build_page(args.users, args.months)
+    results = {
+        "default": measure(lambda content: JSONResponse(jsonable_encoder(content)).body, page, args.repeats),
+        "rows": measure(dumps, page, args.repeats),
+        "columnar": measure(lambda content: dumps(columnar_donor_view(content)), page, args.repeats)
+    }
+    print({"users": args.users, "months": args.months, "orjson": orjson is not None, "brotli": brotli is not None, **results})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Measure how long a fresh API worker takes to import and become ready to serve.
+
+Run from Backend/:  python -m benchmarks.startup --runs 10
+Each run boots a new interpreter, imports main and runs the app's lifespan startup (store
+creation and connection warm-up), as uvicorn would. The command exits non-zero when the
+median startup exceeds CARIYA_STARTUP_TARGET_MS, so it can gate a deploy. Uses the SQLite
+stand-in unless --store firestore is given.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from benchmarks.concurrent_deposits import percentile
+
+BOOT = """
+import asyncio, json, sys
+import main
+
+async def boot():
+    async with main.app.router.lifespan_context(main.app):
+        heavy = sorted(name for name in ("pandas", "numpy", "pyarrow") if name in sys.modules)
+        print(json.dumps({**main.startup_timings, "heavy_modules": heavy}))
+
+asyncio.run(boot())
+"""
+
+
+def boot_once(env):
+    """Boot one worker in a fresh interpreter; return its startup timings."""
+    output = subprocess.run([sys.executable, "-c", BOOT], env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run(runs, store):
+    env = {**os.environ, "CARIYA_STORE": store, "CARIYA_LOG_LEVEL": "ERROR"}
+    boots = [boot_once(env) for _ in range(runs)]
+    startup = [boot['startup_ms'] for boot in boots]
+    target = float(os.getenv("CARIYA_STARTUP_TARGET_MS", "1500"))
+    return {
+        "runs": runs,
+        "import_ms_median": statistics.median(boot['import_ms'] for boot in boots),
+        "store_ready_ms_median": statistics.median(boot['store_ready_ms'] for boot in boots),
+        "startup_ms_median": statistics.median(startup),
+        "startup_ms_p95": percentile(startup, 95),
+        "target_ms": target,
+        "within_target": statistics.median(startup) <= target,
+        "heavy_modules_loaded": boots[-1]['heavy_modules']
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--store", default="sqlite", choices=["sqlite", "firestore"])
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+    result = run(args.runs, args.store)
+    print(result)
+    sys.exit(0 if result['within_target'] else 1)
+
+
+if __name__ == "__main__":
+    main()
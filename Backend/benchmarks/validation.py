@@ -0,0 +1,89 @@
+"""Time the batch validators against the per-row ones on a large synthetic sheet.
+
+Run from Backend/:  python -m benchmarks.validation --rows 100000
+Builds a sheet of synthetic mothers with a share of malformed mobile numbers and ages,
+then validates it both ways (per-row scalar functions, and the batch functions the
+importer uses), and checks that both accept the same rows with the same identifiers.
+"""
+import argparse
+import random
+import time
+import pandas as pd
+from benchmarks.api_load import synthetic_mother
+from utils.unique_identifier_funcs import (
+    normalize_mobile_number, parse_children_ages, format_unique_identifier,
+    normalize_mobile_numbers, parse_children_ages_batch, generate_unique_identifiers
+)
+
+BAD_MOBILES = ["12345", "+2567721234", "not a number", ""]
+BAD_AGES = ["19/2", "a/2", "3.0", " "]
+
+
+def build_sheet(rows, bad_share):
+    rng = random.Random(rows)
+    mothers = [synthetic_mother(index) for index in range(rows)]
+    for mother in mothers:
+        mother['mobile_number'] = mother['mobile_number'].replace('+256', rng.choice(['', '+256 ', '+256-']))
+        if rng.random() < bad_share:
+            mother['mobile_number'] = rng.choice(BAD_MOBILES)
+        if rng.random() < bad_share:
+            mother['ages_of_children_per_birth_order'] = rng.choice(BAD_AGES)
+    return pd.DataFrame(mothers)
+
+
+def validate_scalar(sheet):
+    """Return {row: identifier, or None if invalid} validating one row at a time."""
+    result = {}
+    for row in sheet.itertuples():
+        try:
+            mobile = normalize_mobile_number(row.mobile_number)
+            ages = parse_children_ages(row.ages_of_children_per_birth_order)
+            result[row.Index] = format_unique_identifier(row.first_name, row.surname, mobile, row.num_children, ages)
+        except ValueError:
+            result[row.Index] = None
+    return result
+
+
+def validate_batch(sheet):
+    """Return the identifiers of the valid rows, validating whole columns at once."""
+    mobiles, mobile_errors = normalize_mobile_numbers(sheet['mobile_number'])
+    ages, age_errors = parse_children_ages_batch(sheet['ages_of_children_per_birth_order'])
+    ok = ~mobile_errors & age_errors.isna()
+    return generate_unique_identifiers(
+        sheet.loc[ok, 'first_name'], sheet.loc[ok, 'surname'], mobiles[ok], sheet.loc[ok, 'num_children'], ages[ok]
+    )
+
+
+def timed(func, sheet, repeats):
+    best = None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = func(sheet)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--bad-share", type=float, default=0.05, help="Share of rows given a malformed mobile or ages")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    sheet = build_sheet(args.rows, args.bad_share)
+    scalar, scalar_seconds = timed(validate_scalar, sheet, args.repeats)
+    batch, batch_seconds = timed(validate_batch, sheet, args.repeats)
+    if {row: value for row, value in scalar.items() if value is not None} != batch.to_dict():
+        raise SystemExit("Batch validation disagrees with the per-row functions")
+    print({
+        "rows": args.rows,
+        "valid_rows": len(batch),
+        "scalar_seconds": round(scalar_seconds, 3),
+        "batch_seconds": round(batch_seconds, 3),
+        "speedup": round(scalar_seconds / batch_seconds, 1)
+    })
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,87 @@
-import pandas as pd
-from fastapi import FastAPI, HTTPException, Depends, UploadFile, File
-from fastapi.responses import JSONResponse
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+
+IMPORT_STARTED = time.perf_counter()  # Worker boot is measured from here
+
+from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-import firebase_admin
-from firebase_admin import credentials, firestore
+from utils.storage import Store, create_store, MONTHLY_SAVINGS, MONTHLY_ACTIVITIES, SUMMARY
 from utils.unique_identifier_funcs import normalize_mobile_number, parse_children_ages, generate_unique_identifier
-from utils.helpers import  calculate_expected_savings, update_compliance_score, update_activity_points,calculate_monthly_scores
-from datetime import datetime
-
-# Initialize Firebase
-cred = credentials.Certificate("creds.json")  # Update path
-firebase_admin.initialize_app(cred)
-db = firestore.client()
-
-app = FastAPI(title="Cariya Wallet API")
+from utils.helpers import  calculate_expected_savings, build_user_document
+from utils.summary import ensure_summary, record_savings, record_activity, monthly_savings_view, summary_scores, rebuild_balances_from_ledger
+from utils.ledger import audit_user
+from utils.periods import current_month_key, cycle_month_keys, max_compliance_score, resolve_month_key
+from utils.bulk import ingest_entries
+from utils.mobile_index import lookup_user_id, register_user as register_indexed_user
+from utils.jobs import create_scoring_job, start_job, get_job_status, resume_job, stop_jobs
+from utils.executor import run_blocking, shutdown_executor
+from utils.user_cache import get_cached_user, user_cache, view_etag
+from utils.segments import ANALYTICS, segment_shard_ids, segment_users_and_analyze_trends_async, rebuild_segments
+from utils.export import stream_export, export_month_keys
+from utils.metrics import instrument_store, metrics_middleware, render_metrics
+from utils.logs import configure_logging, get_logger, stop_logging
+from utils.live import live_feed, stream_deltas, start_live_feed, stop_live_feed
+from utils.single_flight import single_flight
+from utils.responses import FastJSONResponse, CompressionMiddleware, columnar_donor_view, dumps
+from utils.counters import read_counters, rebuild_counters, MONTH_FIELDS
+from typing import List, Optional
+
+configure_logging()
+logger = get_logger("api")
+
+STARTUP_TARGET_MS = float(os.getenv("CARIYA_STARTUP_TARGET_MS", "1500"))  # Import to ready, warned about when exceeded
+
+# Storage (Firestore by default, CARIYA_STORE=sqlite for a local stand-in) is created on first use,
+# normally by the lifespan below, so importing this module needs no credentials or network
+_store = None
+_store_lock = threading.Lock()
+startup_timings = {}
+
+
+def get_store():
+    """Return the configured store, counting every operation for /metrics; created on first call."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = instrument_store(create_store())
+    return _store
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """Create and warm up the store before serving; checkpoint jobs and drain datastore calls on shutdown.
+
+    Shutdown stops the logging, executors and live feed that startup (re)creates, so the
+    app can be started again in the same process (e.g. by successive test clients).
+    """
+    configure_logging()
+    started = time.perf_counter()
+    store = await run_blocking(get_store)
+    await run_blocking(store.get_doc, ANALYTICS, segment_shard_ids()[0])  # Opens the datastore connection before the first request
+    await run_blocking(start_live_feed)
+    ready = time.perf_counter()
+    startup_timings.update({
+        "import_ms": round((started - IMPORT_STARTED) * 1000, 1),
+        "store_ready_ms": round((ready - started) * 1000, 1),
+        "startup_ms": round((ready - IMPORT_STARTED) * 1000, 1)
+    })
+    if startup_timings["startup_ms"] > STARTUP_TARGET_MS:
+        logger.warning("Startup exceeded target", extra={**startup_timings, "target_ms": STARTUP_TARGET_MS})
+    else:
+        logger.info("Startup complete", extra=startup_timings)
+    yield
+    stop_live_feed()
+    stop_jobs()
+    shutdown_executor()
+    stop_logging()
+
+
+app = FastAPI(title="Cariya Wallet API", lifespan=lifespan, default_response_class=FastJSONResponse)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  
@@ -22,6 +89,17 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(CompressionMiddleware)
+app.middleware("http")(metrics_middleware)
+
+DONOR_VIEW_PAGE_SIZE = 50
+MAX_DONOR_VIEW_PAGE_SIZE = 500
+DONOR_VIEW_FIELDS = ['first_name', 'surname', 'savings', 'donor_contributions', SUMMARY]
+DASHBOARD_FIELDS = [
+    'first_name', 'surname', 'mobile_number', 'num_children', 'ages_of_children_per_birth_order',
+    'total_savings', 'monthly_data', 'activities', 'activity_points', 'compliance_score',
+    'max_compliance_score', 'donor_contributions'
+]
 
 class LoginRequest(BaseModel):
     mobile_number: str
@@ -38,20 +116,40 @@ class MonthlyActivity(BaseModel):
     activity: str
     partner: str
     month: int  # Month number (1-12)
+    year: Optional[int] = None  # Defaults to the current month's year
 
 class SavingsEntry(BaseModel):
     amount: float
     month: int  # Mo
 
+class BulkSavingsEntry(BaseModel):
+    user_id: str
+    amount: float
+    month: Optional[int] = None  # Defaults to the current month
+    year: Optional[int] = None  # Defaults to the current month's year
+
+class BulkActivityEntry(BaseModel):
+    user_id: str
+    activity: str
+    partner: str
+    month: int
+    year: Optional[int] = None
+
+class BulkSavings(BaseModel):
+    entries: List[BulkSavingsEntry]
+
+class BulkActivities(BaseModel):
+    entries: List[BulkActivityEntry]
+
 
 async def get_db():
-    """Dependency to provide Firestore client."""
-    return db
+    """Dependency to provide the configured store."""
+    return get_store()
 
 
 @app.post("/register")
-async def register_user(user_data: UserRegistration):
-    """Register a new user and store their details in Firestore."""
+async def register_user(user_data: UserRegistration, db: Store = Depends(get_db)):
+    """Register a new user and store their details."""
     try:
         # Validate and normalize inputs
         mobile_normalized = normalize_mobile_number(user_data.mobile_number)
@@ -64,320 +162,587 @@ async def register_user(user_data: UserRegistration):
             user_data.first_name, user_data.surname, mobile_normalized, user_data.num_children, user_data.ages_of_children_per_birth_order
         )
 
-        # Check for duplicates
-        mobile_query = db.collection('users').where('mobile_number', '==', mobile_normalized).get()
-        if mobile_query:
-            raise HTTPException(status_code=400, detail=f"Mobile number {mobile_normalized} is already registered")
+        # Prepare user data for Firestore
+        user_data_dict = build_user_document(
+            user_data.first_name, user_data.surname, mobile_normalized, user_data.num_children, ages, generated_id
+        )
 
-        id_query = db.collection('users').document(generated_id).get()
-        if id_query.exists:
+        # Store user and its mobile index entry, failing atomically on duplicates
+        conflict = await run_blocking(register_indexed_user, db, generated_id, user_data_dict)
+        if conflict == 'mobile_number':
+            raise HTTPException(status_code=400, detail=f"Mobile number {mobile_normalized} is already registered")
+        if conflict == 'user_id':
             raise HTTPException(status_code=400, detail=f"User with ID {generated_id} already exists")
+        return {"message": "User registered successfully", "generated_id": generated_id}
 
+    except HTTPException as e:
+        raise e
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.exception("Request failed", extra={"handler": "register_user"})
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
-        # Prepare user data for Firestore
-        user_data_dict = {
-            "first_name": user_data.first_name,
-            "surname": user_data.surname,
-            "mobile_number": mobile_normalized,
-            "num_children": user_data.num_children,
-            "ages_of_children_per_birth_order": ages,
-            "generated_id": generated_id,
-            'activity_points': 0,
-            "savings": 0.0,
-            "milestone_score": 0,
-            "compliance_score": 0
-        }
-
-        # Store user in Firestore
-        db.collection('users').document(generated_id).set(user_data_dict)
-        return {"message": "User registered successfully", "generated_id": generated_id}
+@app.post("/users/import")
+async def import_users(file: UploadFile = File(...), db: Store = Depends(get_db)):
+    """Bulk-register beneficiaries from an .xlsx or .csv sheet, reporting errors per row."""
+    try:
+        if not file.filename.lower().endswith(('.xlsx', '.csv')):
+            raise HTTPException(status_code=400, detail="Upload an .xlsx or .csv file")
+        from utils.importer import import_beneficiaries  # Loads pandas, which only this route needs
 
+        report = await run_blocking(import_beneficiaries, db, file.file, file.filename)
+        return {"message": f"Imported {report['imported']} of {report['rows_processed']} rows", **report}
     except HTTPException as e:
         raise e
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
+        logger.exception("Request failed", extra={"handler": "import_users"})
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 @app.post("/login")
-async def login_user(login_data: LoginRequest, db: firestore.Client = Depends(get_db)):
+async def login_user(login_data: LoginRequest, db: Store = Depends(get_db)):
     try:
         mobile_normalized = normalize_mobile_number(login_data.mobile_number)
-        user_query = db.collection('users').where('mobile_number', '==', mobile_normalized).get()
-        if not user_query:
+        user_id = await run_blocking(lookup_user_id, db, mobile_normalized)
+        if user_id is None:
             raise HTTPException(status_code=401, detail="Invalid mobile number or password")
         
-        user_doc = user_query[0]
-        user = user_doc.to_dict()
         # Add password verification logic here (e.g., check hashed password)
         # For now, assume password is valid
         return {
             "message": "Login successful",
-            "user_id": user['generated_id'],
+            "user_id": user_id,
             "token": "dummy-token"  # Replace with actual token generation
         }
     except HTTPException as e:
         raise e
     except Exception as e:
+        logger.exception("Request failed", extra={"handler": "login_user"})
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
     
 @app.get("/users/{unique_id}")
-async def get_user_info(unique_id: str, db: firestore.Client = Depends(get_db)):
+async def get_user_info(unique_id: str, request: Request, db: Store = Depends(get_db)):
     """Retrieve user information."""
     try:
-        doc = db.collection('users').document(unique_id).get()
-        if not doc.exists:
+        user, etag = await run_blocking(get_cached_user, db, unique_id)
+        if user is None:
             raise HTTPException(status_code=404, detail=f"No user found with unique identifier {unique_id}")
-        
-        user = doc.to_dict()
-        total_savings = 0
-        monthly_data = {}
-        savings_docs = db.collection('users').document(unique_id).collection('monthly_savings').get()
-        for s_doc in savings_docs:
-            month_key = s_doc.id
-            s_data = s_doc.to_dict()
-            total_savings += s_data['savings']
-            monthly_data[month_key] = s_data
-
-        return {
+        as_of = current_month_key()
+        etag = view_etag(etag, as_of, max_compliance_score(as_of))  # Scores cover the cycle up to as_of
+        # With the memory cache backend a write only invalidates the worker that made it, so
+        # other workers may answer 304 with their copy until it expires (CARIYA_USER_CACHE_TTL).
+        # Run several workers with CARIYA_CACHE_BACKEND=redis.
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+
+        summary = await run_blocking(ensure_summary, db, unique_id, user, as_of)
+        monthly_data = monthly_savings_view(summary)
+        total_savings = sum(s_data['savings'] for s_data in monthly_data.values())
+        activity_points, compliance_score = summary_scores(summary, cycle_month_keys(as_of))
+
+        # Returned as a response so FastAPI does not walk the nested months with jsonable_encoder
+        return FastJSONResponse({
             "first_name": user['first_name'],
             "surname": user['surname'],
             "total_savings": total_savings,
             "monthly_data": monthly_data,
-            "activity_points": user['activity_points'],
+            "activity_points": activity_points,
             "milestone_score": user['milestone_score'],
-            "compliance_score": user['compliance_score']
-        }
+            "compliance_score": compliance_score
+        }, headers={"ETag": etag})
     except HTTPException as e:
         raise e
     except Exception as e:
+        logger.exception("Request failed", extra={"handler": "get_user_info"})
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/users/{unique_id}/savings")
-async def update_savings(unique_id: str, amount: float, month: int = None, db: firestore.Client = Depends(get_db)):
+async def update_savings(unique_id: str, amount: float, month: int = None, year: int = None, db: Store = Depends(get_db)):
     """Update monthly savings and calculate scores."""
     try:
         if amount < 0:
             raise HTTPException(status_code=400, detail="Savings amount cannot be negative")
         
-        doc_ref = db.collection('users').document(unique_id)
-        doc = doc_ref.get()
-        if not doc.exists:
+        user = await run_blocking(db.get_user, unique_id)
+        if user is None:
             raise HTTPException(status_code=404, detail=f"No user found with unique identifier {unique_id}")
         
-        user = doc.to_dict()
         expected_savings = calculate_expected_savings(user['num_children'])
         
-        current_month = datetime.now().month if month is None else month
-        if current_month > 4:  # Limit to April 2025
-            current_month = 4
-        month_key = f"{datetime.now().year}-{current_month:02d}"
-
-        # Update monthly savings
-        savings_ref = doc_ref.collection('monthly_savings').document(month_key)
-        savings_doc = savings_ref.get()
-        if savings_doc.exists:
-            current_savings = savings_doc.to_dict()['savings']
-        else:
-            current_savings = 0
-        
-        new_savings = current_savings + amount
-        milestone_score = 1 if new_savings >= expected_savings else 0
-        savings_ref.set({
-            'savings': new_savings,
-            'milestone_score': milestone_score
-        })
+        as_of = current_month_key()
+        month_key = resolve_month_key(month, year, as_of)
 
-        # Update compliance score
-        compliance_score = update_compliance_score(db, unique_id, current_month)
-        doc_ref.update({'compliance_score': compliance_score})
+        # Update monthly savings, summary and compliance score
+        entry, _, compliance_score = await run_blocking(
+            record_savings, db, unique_id, user, month_key, amount, as_of, update_total=False
+        )
 
         return {
             "message": f"Updated savings for {user['first_name']} {user['surname']} in {month_key}",
-            "new_savings": new_savings,
+            "new_savings": entry['savings'],
             "expected_savings": expected_savings,
-            "milestone_score": milestone_score,
-            "compliance_score": f"{compliance_score}/8"
+            "milestone_score": entry['milestone_score'],
+            "compliance_score": f"{compliance_score}/{max_compliance_score(as_of)}"
         }
     except HTTPException as e:
         raise e
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
+        logger.exception("Request failed", extra={"handler": "update_savings"})
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/users/{unique_id}/compliance")
-async def get_compliance(unique_id: str, db: firestore.Client = Depends(get_db)):
+async def get_compliance(unique_id: str, request: Request, response: Response, db: Store = Depends(get_db)):
     """Get annual compliance score."""
     try:
-        doc = db.collection('users').document(unique_id).get()
-        if not doc.exists:
+        user, etag = await run_blocking(get_cached_user, db, unique_id)
+        if user is None:
             raise HTTPException(status_code=404, detail=f"No user found with unique identifier {unique_id}")
-        
-        user = doc.to_dict()
-        current_month = min(datetime.now().month, 4)  # Limit to April 2025
-        max_compliance = current_month * 2  # 2 points per month
+        as_of = current_month_key()
+        etag = view_etag(etag, as_of, max_compliance_score(as_of))
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        response.headers["ETag"] = etag
+
+        summary = await run_blocking(ensure_summary, db, unique_id, user, as_of)
+        _, compliance_score = summary_scores(summary, cycle_month_keys(as_of))
         return {
             "first_name": user['first_name'],
             "surname": user['surname'],
-            "compliance_score": f"{user['compliance_score']}/{max_compliance}"
+            "compliance_score": f"{compliance_score}/{max_compliance_score(as_of)}"
         }
     except HTTPException as e:
         raise e
     except Exception as e:
+        logger.exception("Request failed", extra={"handler": "get_compliance"})
         raise HTTPException(status_code=500, detail=str(e))
     
 
-@app.post("/users/{unique_id}/activities")
-async def add_monthly_activity(unique_id: str, activity_data: MonthlyActivity, db: firestore.Client = Depends(get_db)):
-    """Add a monthly activity for a user and update activity points."""
+@app.get("/users/{unique_id}/dashboard")
+async def get_dashboard(unique_id: str, request: Request, response: Response, fields: Optional[str] = None, db: Store = Depends(get_db)):
+    """Everything the mother's view renders in one response; ?fields=a,b returns only those fields.
+
+    The ETag covers the user, the month the scores are computed as of, the selected
+    fields and, when selected, the activities.
+    """
     try:
-        user_ref = db.collection('users').document(unique_id)
-        user_doc = user_ref.get()
-        if not user_doc.exists:
+        selected = DASHBOARD_FIELDS if fields is None else [field.strip() for field in fields.split(',') if field.strip()]
+        unknown = [field for field in selected if field not in DASHBOARD_FIELDS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown dashboard fields: {', '.join(unknown)}")
+
+        user, etag = await run_blocking(get_cached_user, db, unique_id)
+        if user is None:
             raise HTTPException(status_code=404, detail=f"No user found with unique identifier {unique_id}")
 
-        if not 1 <= activity_data.month <= 12:
-            raise HTTPException(status_code=400, detail="Month must be between 1 and 12")
+        as_of = current_month_key()
+        activities = None
+        if 'activities' in selected:
+            # Activity names and partners live only in the subcollection, so read it just when asked for
+            activities = await run_blocking(db.get_months, unique_id, MONTHLY_ACTIVITIES)
+        etag = view_etag(etag, as_of, max_compliance_score(as_of), selected, activities)
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        response.headers["ETag"] = etag
+
+        summary = await run_blocking(ensure_summary, db, unique_id, user, as_of)
+        activity_points, compliance_score = summary_scores(summary, cycle_month_keys(as_of))
+        monthly_data = monthly_savings_view(summary)
+        for month_key, entry in monthly_data.items():
+            entry['activity'] = summary[month_key].get('activity', 0)
+
+        dashboard = {
+            "first_name": user['first_name'],
+            "surname": user['surname'],
+            "mobile_number": user['mobile_number'],
+            "num_children": user['num_children'],
+            "ages_of_children_per_birth_order": user['ages_of_children_per_birth_order'],
+            "total_savings": sum(s_data['savings'] for s_data in monthly_data.values()),
+            "monthly_data": monthly_data,
+            "activity_points": activity_points,
+            "compliance_score": f"{compliance_score}/{max_compliance_score(as_of)}",
+            "max_compliance_score": max_compliance_score(as_of),
+            "donor_contributions": user.get('donor_contributions', 0.0)
+        }
+        if activities is not None:
+            dashboard['activities'] = {
+                month_key: {"activity": a_data.get('activity'), "partner": a_data.get('partner')}
+                for month_key, a_data in sorted(activities.items())
+            }
+        return {field: dashboard[field] for field in selected}
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        logger.exception("Request failed", extra={"handler": "get_dashboard"})
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/users/{unique_id}/ledger")
+async def get_ledger(unique_id: str, db: Store = Depends(get_db)):
+    """Balances derived from the user's ledger (snapshot + tail), and where the stored balances disagree."""
+    try:
+        audit = await run_blocking(audit_user, db, unique_id)
+        if audit is None:
+            raise HTTPException(status_code=404, detail=f"No user found with unique identifier {unique_id}")
+        balance, discrepancies = audit
+        return {**balance, "consistent": not discrepancies, "discrepancies": discrepancies}
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        logger.exception("Request failed", extra={"handler": "get_ledger"})
+        raise HTTPException(status_code=500, detail=str(e))
 
-        current_month = min(datetime.now().month, 4)  # Limit to April 2025
-        if activity_data.month > current_month:
-            raise HTTPException(status_code=400, detail=f"Cannot add activity for future month {activity_data.month}")
+@app.post("/users/{unique_id}/ledger/rebuild")
+async def rebuild_from_ledger(unique_id: str, db: Store = Depends(get_db)):
+    """Replay the user's ledger onto their stored savings balances and rescore them."""
+    try:
+        balance = await run_blocking(rebuild_balances_from_ledger, db, unique_id, current_month_key())
+        return {"message": f"Balances rebuilt from {balance['events']} ledger events", **balance}
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        logger.exception("Request failed", extra={"handler": "rebuild_from_ledger"})
+        raise HTTPException(status_code=500, detail=str(e))
 
-        month_key = f"{datetime.now().year}-{activity_data.month:02d}"
-        activity_ref = user_ref.collection('monthly_activities').document(month_key)
-        activity_ref.set({
-            "activity": activity_data.activity,
-            "partner": activity_data.partner,
-            "activity_points": 1
-        })
+@app.post("/users/{unique_id}/activities")
+async def add_monthly_activity(unique_id: str, activity_data: MonthlyActivity, db: Store = Depends(get_db)):
+    """Add a monthly activity for a user and update activity points."""
+    try:
+        user = await run_blocking(db.get_user, unique_id)
+        if user is None:
+            raise HTTPException(status_code=404, detail=f"No user found with unique identifier {unique_id}")
 
-        activity_points = update_activity_points(db, unique_id, current_month)
-        compliance_score = update_compliance_score(db, unique_id, current_month)
+        as_of = current_month_key()
+        month_key = resolve_month_key(activity_data.month, activity_data.year, as_of)
+        activity_points, compliance_score = await run_blocking(
+            record_activity, db, unique_id, user, month_key, activity_data.activity, activity_data.partner, as_of
+        )
 
         return {
             "message": f"Activity added for month {month_key}",
             "activity_points": activity_points,
-            "compliance_score": f"{compliance_score}/{current_month * 2}"
+            "compliance_score": f"{compliance_score}/{max_compliance_score(as_of)}"
         }
 
     except HTTPException as e:
         raise e
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
+        logger.exception("Request failed", extra={"handler": "add_monthly_activity"})
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 @app.post("/users/{unique_id}/savings")
-async def add_savings(unique_id: str, savings_data: SavingsEntry, db: firestore.Client = Depends(get_db)):
+async def add_savings(unique_id: str, savings_data: SavingsEntry, db: Store = Depends(get_db)):
     """Add savings for a user in the current month, allowing multiple installments."""
     try:
         # Validate user existence
-        user_ref = db.collection('users').document(unique_id)
-        user_doc = user_ref.get()
-        if not user_doc.exists:
+        user = await run_blocking(db.get_user, unique_id)
+        if user is None:
             raise HTTPException(status_code=404, detail=f"No user found with unique identifier {unique_id}")
         
         # Validate savings amount
         if savings_data.amount < 0:
             raise HTTPException(status_code=400, detail="Savings amount cannot be negative")
         
-        user = user_doc.to_dict()
         expected_savings = calculate_expected_savings(user['num_children'])
 
         # Automatically determine the current month
-        current_month = min(datetime.now().month, 4)  # Limit to April 2025 (as of May 2, 2025)
-        month_key = f"{datetime.now().year}-{current_month:02d}"
-
-        # Update monthly savings (accumulate if already exists)
-        savings_ref = user_ref.collection('monthly_savings').document(month_key)
-        savings_doc = savings_ref.get()
-        if savings_doc.exists:
-            current_savings = savings_doc.to_dict()['savings']
-        else:
-            current_savings = 0
-        
-        new_savings = current_savings + savings_data.amount
-        milestone_score = 1 if new_savings >= expected_savings else 0
-        savings_ref.set({
-            'savings': new_savings,
-            'milestone_score': milestone_score
-        })
+        month_key = current_month_key()
 
-        # Update total savings in user document
-        total_savings = user['savings'] + savings_data.amount
-        user_ref.update({'savings': total_savings})
-
-        # Recalculate compliance score
-        compliance_score = update_compliance_score(db, unique_id, current_month)
+        # Update monthly savings (accumulate if already exists), total savings and compliance score
+        entry, total_savings, compliance_score = await run_blocking(
+            record_savings, db, unique_id, user, month_key, savings_data.amount, month_key
+        )
 
         return {
             "message": f"Savings added for month {month_key}",
-            "monthly_savings": new_savings,
+            "monthly_savings": entry['savings'],
             "total_savings": total_savings,
             "expected_savings": expected_savings,
-            "milestone_score": milestone_score,
-            "compliance_score": f"{compliance_score}/{current_month * 2}"
+            "milestone_score": entry['milestone_score'],
+            "compliance_score": f"{compliance_score}/{max_compliance_score(month_key)}"
         }
 
     except HTTPException as e:
         raise e
     except Exception as e:
+        logger.exception("Request failed", extra={"handler": "add_savings"})
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
     
 
 
-@app.post("/calculate-scores")
-async def calculate_scores(month: int = None, db: firestore.Client = Depends(get_db)):
-    """Calculate and update milestone, activity, and compliance scores for all users."""
+@app.post("/savings/batch")
+async def add_savings_batch(batch: BulkSavings, db: Store = Depends(get_db)):
+    """Record savings for many users at once; each user's deposits are applied and scored once."""
+    try:
+        return await run_blocking(ingest_entries, db, savings_entries=batch.entries)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.exception("Request failed", extra={"handler": "add_savings_batch"})
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+
+@app.post("/activities/batch")
+async def add_activities_batch(batch: BulkActivities, db: Store = Depends(get_db)):
+    """Record activities for many users at once; each user's activities are applied and scored once."""
     try:
-        result = calculate_monthly_scores(db, month)
-        return result
+        return await run_blocking(ingest_entries, db, activity_entries=batch.entries)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
+        logger.exception("Request failed", extra={"handler": "add_activities_batch"})
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+
+@app.post("/calculate-scores", status_code=202)
+async def calculate_scores(month: int = None, year: int = None, workers: int = None, db: Store = Depends(get_db)):
+    """Enqueue a background job that calculates milestone, activity, and compliance scores for all users."""
+    try:
+        job, created = await run_blocking(create_scoring_job, db, month, workers, year)
+        if not created:
+            return {
+                "message": f"Score calculation for month {job['month_key']} is already {job['status']}",
+                "job_id": job['job_id'],
+                "status_url": f"/jobs/{job['job_id']}"
+            }
+        start_job(db, job['job_id'])
+        return {
+            "message": f"Score calculation for month {job['month_key']} queued",
+            "job_id": job['job_id'],
+            "status_url": f"/jobs/{job['job_id']}"
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.exception("Request failed", extra={"handler": "calculate_scores"})
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, db: Store = Depends(get_db)):
+    """Get a background job's status, progress and throughput."""
+    try:
+        job = await run_blocking(get_job_status, db, job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"No job found with id {job_id}")
+        return job
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        logger.exception("Request failed", extra={"handler": "get_job"})
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+
+@app.post("/jobs/{job_id}/resume", status_code=202)
+async def resume_scoring_job(job_id: str, db: Store = Depends(get_db)):
+    """Resume a failed or interrupted job from its last committed chunk."""
+    try:
+        job = await run_blocking(resume_job, db, job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"No job found with id {job_id}")
+        return {
+            "message": f"Job {job_id} resumed",
+            "job_id": job_id,
+            "status_url": f"/jobs/{job_id}"
+        }
+    except HTTPException as e:
+        raise e
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        logger.exception("Request failed", extra={"handler": "resume_scoring_job"})
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
     
 
 @app.get("/donor-view")
-async def donor_view(db: firestore.Client = Depends(get_db)):
-    """Provide a view for donors to see all users' savings and contributions."""
+async def donor_view(limit: int = DONOR_VIEW_PAGE_SIZE, start_after: str = None, shape: str = "rows", db: Store = Depends(get_db)):
+    """Provide a paginated view for donors of users' savings and contributions.
+
+    Pass the returned next_cursor as start_after to fetch the following page. Each page
+    costs one projected users query; monthly data comes from each user's summary, with a
+    batched monthly_savings read only for users whose summary has not been built yet.
+    last_event_id is where /donor-view/stream should resume from to keep the page live.
+    Concurrent requests for the same page share one read and its encoded body (see
+    utils.single_flight). ?shape=columnar returns the page as parallel columns with
+    month keys listed once (see utils.responses.columnar_donor_view).
+    """
     try:
-        users = db.collection('users').get()
-        if not users:
-            return {"message": "No users found"}
-
-        donor_data = []
-        for user_doc in users:
-            user = user_doc.to_dict()
-            user_id = user_doc.id
-            monthly_data = {}
-            total_user_savings = 0
-            total_donor_contributions = user.get('donor_contributions', 0.0)
-
-            savings_docs = db.collection('users').document(user_id).collection('monthly_savings').get()
-            for s_doc in savings_docs:
-                month_key = s_doc.id
-                s_data = s_doc.to_dict()
-                user_savings = s_data.get('savings', 0.0)
-                donor_contribution = s_data.get('donor_contribution', 0.0)
-                total_user_savings += user_savings
-                monthly_data[month_key] = {
-                    "user_savings": user_savings,
-                    "donor_contribution": donor_contribution
-                }
-
-            donor_data.append({
-                "user_id": user_id,
-                "first_name": user['first_name'],
-                "surname": user['surname'],
-                "total_savings": user.get('savings', 0.0),
-                "total_user_savings": total_user_savings,
-                "total_donor_contributions": total_donor_contributions,
-                "monthly_data": monthly_data
-            })
-
-        return {"donor_view": donor_data}
+        if not 1 <= limit <= MAX_DONOR_VIEW_PAGE_SIZE:
+            raise HTTPException(status_code=400, detail=f"Limit must be between 1 and {MAX_DONOR_VIEW_PAGE_SIZE}")
+        if shape not in ("rows", "columnar"):
+            raise HTTPException(status_code=400, detail="Shape must be rows or columnar")
+        body = await single_flight.run(("donor-view", limit, start_after, shape), _donor_view_body, db, limit, start_after, shape)
+        return Response(body, media_type="application/json")
 
+    except HTTPException as e:
+        raise e
     except Exception as e:
+        logger.exception("Request failed", extra={"handler": "donor_view"})
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+async def _donor_view_body(db, limit, start_after, shape):
+    """Read one donor-view page and encode it as JSON in the requested shape."""
+    page = await _donor_view_page(db, limit, start_after)
+    return dumps(columnar_donor_view(page) if shape == "columnar" and 'donor_view' in page else page)
+
+async def _donor_view_page(db, limit, start_after):
+    """Read and build one donor-view page."""
+    last_event_id = live_feed.last_id()  # Taken before reading, so no change made during the read is missed
+    users = await run_blocking(db.list_users, limit, start_after, DONOR_VIEW_FIELDS)
+    if not users and start_after is None:
+        return {"message": "No users found"}
+
+    user_ids = [user_id for user_id, _ in users]
+    savings_by_user = {user_id: monthly_savings_view(user[SUMMARY]) for user_id, user in users if SUMMARY in user}
+    missing = [user_id for user_id in user_ids if user_id not in savings_by_user]
+    if missing:
+        savings_by_user.update(await run_blocking(db.get_months_for_users, missing, MONTHLY_SAVINGS, cycle_month_keys()))
+
+    donor_data = []
+    for user_id, user in users:
+        monthly_data = {}
+        total_user_savings = 0
+        total_donor_contributions = user.get('donor_contributions', 0.0)
+
+        for month_key, s_data in savings_by_user[user_id].items():
+            user_savings = s_data.get('savings', 0.0)
+            donor_contribution = s_data.get('donor_contribution', 0.0)
+            total_user_savings += user_savings
+            monthly_data[month_key] = {
+                "user_savings": user_savings,
+                "donor_contribution": donor_contribution
+            }
+
+        donor_data.append({
+            "user_id": user_id,
+            "first_name": user['first_name'],
+            "surname": user['surname'],
+            "total_savings": user.get('savings', 0.0),
+            "total_user_savings": total_user_savings,
+            "total_donor_contributions": total_donor_contributions,
+            "monthly_data": monthly_data
+        })
+
+    next_cursor = user_ids[-1] if len(users) == limit else None
+    return {"donor_view": donor_data, "next_cursor": next_cursor, "last_event_id": last_event_id}
+
+@app.get("/donor-view/stream")
+async def donor_view_stream(request: Request, last_event_id: str = None):
+    """Stream per-user donor-view changes as Server-Sent Events.
+
+    Resumes after the Last-Event-ID header (sent by EventSource on reconnect) or
+    ?last_event_id= (e.g. the one returned by /donor-view); starts from now without either.
+    """
+    after = request.headers.get("last-event-id") or last_event_id
+    return StreamingResponse(stream_deltas(after), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"  # Stop reverse proxies from holding events back
+    })
+
+@app.get("/analytics/segments")
+async def get_segments(db: Store = Depends(get_db)):
+    """Compliance segments and trends, read from the running aggregates instead of scanning users."""
+    try:
+        return await single_flight.run(("analytics/segments",), segment_users_and_analyze_trends_async, db)
+    except Exception as e:
+        logger.exception("Request failed", extra={"handler": "get_segments"})
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+@app.post("/analytics/segments/rebuild")
+async def rebuild_segment_aggregates(db: Store = Depends(get_db)):
+    """Recompute the segment aggregates from every user (e.g. after writes made outside this API)."""
+    try:
+        doc = await run_blocking(rebuild_segments, db)
+        return {
+            "message": "Segment aggregates rebuilt",
+            "users": sum(bucket['count'] for bucket in doc['buckets'].values()),
+            "rebuilt_at": doc['rebuilt_at']
+        }
+    except Exception as e:
+        logger.exception("Request failed", extra={"handler": "rebuild_segment_aggregates"})
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+@app.get("/stats")
+async def get_stats(month: int = None, year: int = None, db: Store = Depends(get_db)):
+    """Programme totals and one month's totals (the current month by default), summed from the sharded counters."""
+    try:
+        month_key = resolve_month_key(month, year)
+        totals = await single_flight.run(("stats",), run_blocking, read_counters, db)
+        return {
+            "mothers": totals['mothers'],
+            "total_deposits": totals['deposits'],
+            "total_donor_contributions": totals['donor_contributions'],
+            "month_key": month_key,
+            "month": totals['months'].get(month_key, dict.fromkeys(MONTH_FIELDS, 0)),
+            "months": totals['months']
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.exception("Request failed", extra={"handler": "get_stats"})
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+@app.post("/stats/rebuild")
+async def rebuild_stats(db: Store = Depends(get_db)):
+    """Recompute the programme counters from every user (e.g. after writes made outside this API)."""
+    try:
+        totals = await run_blocking(rebuild_counters, db)
+        return {"message": "Programme counters rebuilt", "mothers": totals['mothers'], "months": len(totals['months'])}
+    except Exception as e:
+        logger.exception("Request failed", extra={"handler": "rebuild_stats"})
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+@app.get("/export/{table}")
+async def export_table(table: str, format: str = "parquet", year: int = None, month: str = None, db: Store = Depends(get_db)):
+    """Stream users, savings or activities as a Parquet file or an Arrow IPC stream (?format=arrow).
+
+    Savings and activities cover every month of ?year (default: this year), or only ?month=YYYY-MM.
+    """
+    try:
+        chunks = stream_export(db, table, format, export_month_keys(year, month))
+        media_type = "application/vnd.apache.parquet" if format == "parquet" else "application/vnd.apache.arrow.stream"
+        extension = "parquet" if format == "parquet" else "arrows"
+        return StreamingResponse(chunks, media_type=media_type, headers={
+            "Content-Disposition": f'attachment; filename="{table}.{extension}"'
+        })
+    except ImportError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.exception("Request failed", extra={"handler": "export_table"})
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Hit/miss counters of the user read cache, for monitoring."""
+    return user_cache.stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Request latency and datastore reads/writes/queries per route, in Prometheus text format."""
+    stats = user_cache.stats()
+    live = live_feed.stats()
+    coalesced = single_flight.stats()
+    extra = [
+        ("cariya_user_cache_hits_total", "User cache hits.", "counter", stats['hits']),
+        ("cariya_user_cache_misses_total", "User cache misses.", "counter", stats['misses']),
+        ("cariya_user_cache_invalidations_total", "User cache invalidations.", "counter", stats['invalidations']),
+        ("cariya_live_subscribers", "Clients connected to /donor-view/stream.", "gauge", live['subscribers']),
+        ("cariya_live_events_total", "User changes buffered for /donor-view/stream.", "counter", live['published']),
+        ("cariya_coalesced_computations_total", "Expensive reads actually computed, by name.", "counter",
+         [({"name": name}, counts['computed']) for name, counts in sorted(coalesced.items())]),
+        ("cariya_coalesced_requests_total", "Requests answered with another request's result, by name and how (in_flight or window).", "counter",
+         [({"name": name, "via": via}, counts[via]) for name, counts in sorted(coalesced.items()) for via in ("in_flight", "window")])
+    ]
+    if startup_timings:
+        extra.append(("cariya_startup_seconds", "Seconds from module import to ready to serve.", "gauge", startup_timings['startup_ms'] / 1000))
+    return render_metrics(extra)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,75 @@
+import contextvars
+import os
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from utils.summary import record_entries
+from utils.periods import current_month_key, max_compliance_score, resolve_month_key
+from utils.logs import get_logger
+
+BULK_WORKERS = int(os.getenv("CARIYA_BULK_WORKERS", "8"))
+MAX_BULK_ENTRIES = 5000
+
+logger = get_logger("bulk")
+
+
+def ingest_entries(db, savings_entries=(), activity_entries=(), workers=None):
+    """Apply savings and activity entries for many users, grouped so each user is written once.
+
+    Entries need user_id, month and year attributes (month/year may be None), plus amount (savings) or activity and partner
+    (activities). Every user's group is applied in one transaction. Groups run concurrently.
+    Returns one result per entry, in request order (savings entries first).
+    """
+    as_of = current_month_key()
+    entries = [('savings', entry) for entry in savings_entries] + [('activity', entry) for entry in activity_entries]
+    if len(entries) > MAX_BULK_ENTRIES:
+        raise ValueError(f"At most {MAX_BULK_ENTRIES} entries can be submitted at once")
+
+    results = [None] * len(entries)
+    groups = defaultdict(lambda: {"indexes": [], "deposits": [], "activities": []})
+    for index, (kind, entry) in enumerate(entries):
+        try:
+            month_key = resolve_month_key(entry.month, entry.year, as_of)
+            if kind == 'savings' and entry.amount < 0:
+                raise ValueError("Savings amount cannot be negative")
+        except ValueError as e:
+            results[index] = {"index": index, "user_id": entry.user_id, "status": "failed", "error": str(e)}
+            continue
+        group = groups[entry.user_id]
+        group['indexes'].append((index, month_key))
+        if kind == 'savings':
+            group['deposits'].append((month_key, entry.amount))
+        else:
+            group['activities'].append((month_key, entry.activity, entry.partner))
+
+    users = db.get_users(list(groups))
+
+    def apply_group(user_id):
+        group = groups[user_id]
+        try:
+            if user_id not in users:
+                raise ValueError(f"No user found with unique identifier {user_id}")
+            outcome = record_entries(db, user_id, users[user_id], group['deposits'], group['activities'], as_of)
+            outcome['compliance_score'] = f"{outcome['compliance_score']}/{max_compliance_score(as_of)}"
+            item = {"status": "applied", **outcome}
+        except ValueError as e:
+            item = {"status": "failed", "error": str(e)}
+        except Exception:
+            # Any other failure (e.g. a datastore error) fails this user's entries, not the whole request
+            logger.exception("Bulk entries failed", extra={"user_id": user_id, "entries": len(group['indexes'])})
+            item = {"status": "failed", "error": "Entries could not be applied"}
+        for index, month_key in group['indexes']:
+            results[index] = {"index": index, "user_id": user_id, "month_key": month_key, **item}
+
+    with ThreadPoolExecutor(max_workers=workers or BULK_WORKERS, thread_name_prefix="cariya-bulk") as pool:
+        # Each group runs in a copy of this context so its datastore operations count towards the request
+        futures = [pool.submit(contextvars.copy_context().run, apply_group, user_id) for user_id in groups]
+        for future in futures:
+            future.result()
+
+    applied = sum(1 for result in results if result['status'] == 'applied')
+    return {
+        "applied": applied,
+        "failed": len(results) - applied,
+        "users_updated": len({result['user_id'] for result in results if result['status'] == 'applied'}),
+        "results": results
+    }
@@ -0,0 +1,131 @@
+"""Sharded programme-wide counters: money deposited and matched, mothers, and per-month activity.
+
+A single totals document would take a write from every deposit, and Firestore sustains
+only about one write per second on a document. Each change is instead added to one of
+CARIYA_COUNTER_SHARDS documents, picked at random, and reads sum every shard. Shards
+hold programme totals plus a months map:
+
+    counters/programme-{shard}: {deposits, donor_contributions, mothers,
+                                 months: {YYYY-MM: {deposits, donor_contributions, active_mothers, activities}}}
+
+active_mothers counts mothers with savings or an activity in the month, and activities
+counts mothers with an activity. Only ever raise the shard count: shards beyond it are
+not read.
+"""
+import copy
+import os
+import random
+from collections import defaultdict
+from datetime import datetime
+from utils.storage import SUMMARY, Increment, add_values
+
+COUNTERS = 'counters'
+PROGRAMME = 'programme'
+COUNTER_SHARDS = int(os.getenv("CARIYA_COUNTER_SHARDS", "20"))
+PROGRAMME_FIELDS = ('deposits', 'donor_contributions', 'mothers')
+MONTH_FIELDS = ('deposits', 'donor_contributions', 'active_mothers', 'activities')
+
+
+def shard_ids(shards=COUNTER_SHARDS):
+    return [f"{PROGRAMME}-{shard}" for shard in range(shards)]
+
+
+def active_in_month(entry):
+    """Return whether a summary entry has savings or an activity."""
+    return entry.get('savings', 0) > 0 or bool(entry.get('activity', 0))
+
+
+def counter_changes(month_key=None, **amounts):
+    """Return {counter: amount} for the given amounts, programme-wide and for month_key.
+
+    deposits and donor_contributions count towards both, mothers only towards the
+    programme, active_mothers and activities only towards the month.
+    """
+    changes = {}
+    for name, amount in amounts.items():
+        if not amount:
+            continue
+        amount = int(amount) if isinstance(amount, bool) else amount  # Flags such as "became active" count as 1
+        if name in PROGRAMME_FIELDS:
+            changes[name] = amount
+        if month_key is not None and name in MONTH_FIELDS:
+            changes[f"months.{month_key}.{name}"] = amount
+    return changes
+
+
+def add_changes(*changes):
+    """Sum counter changes (e.g. from several months or users) into one."""
+    total = defaultdict(int)
+    for change in changes:
+        for name, amount in change.items():
+            total[name] += amount
+    return {name: amount for name, amount in total.items() if amount}
+
+
+def record_counters(target, changes):
+    """Add counter changes to one random shard through a store, write batch or transaction.
+
+    Write paths pass the transaction or batch that changes the balances, so the counters
+    move in the same commit.
+    """
+    if changes:
+        target.merge_doc(COUNTERS, random.choice(shard_ids()), {name: Increment(amount) for name, amount in changes.items()})
+
+
+def read_counters(db):
+    """Return the programme totals summed over every shard, with one batched read."""
+    totals = {field: 0 for field in PROGRAMME_FIELDS}
+    totals['months'] = {}
+    for shard in db.get_docs(COUNTERS, shard_ids()).values():
+        add_values(totals, shard)
+    for month in totals['months'].values():
+        for field in MONTH_FIELDS:
+            month.setdefault(field, 0)
+    return totals
+
+
+def rebuild_counters(db, page_size=1000):
+    """Recompute the counters from every user's summary; writes them to the first shard and clears the rest.
+
+    Changes recorded while the users are scanned are carried over: the shards are read
+    before the scan and again in the transaction that writes the new baseline, and
+    whatever they gained in between is added to it. A rebuild that finished during the
+    scan is kept as it is. Returns the counters as read_counters does.
+    """
+    before = db.get_docs(COUNTERS, shard_ids())
+    totals = {field: 0 for field in PROGRAMME_FIELDS}
+    months = defaultdict(lambda: dict.fromkeys(MONTH_FIELDS, 0))
+    cursor = None
+    while True:
+        users = db.list_users(limit=page_size, start_after=cursor, fields=[SUMMARY])
+        if not users:
+            break
+        for _, user in users:
+            totals['mothers'] += 1
+            for month_key, entry in user.get(SUMMARY, {}).items():
+                month = months[month_key]
+                month['deposits'] += entry.get('savings', 0.0)
+                month['donor_contributions'] += entry.get('donor_contribution', 0.0)
+                month['activities'] += entry.get('activity', 0)
+                month['active_mothers'] += 1 if active_in_month(entry) else 0
+        cursor = users[-1][0]
+
+    totals['deposits'] = sum(month['deposits'] for month in months.values())
+    totals['donor_contributions'] = sum(month['donor_contributions'] for month in months.values())
+    db.run_transaction(_apply_rebuild, before, {**totals, 'months': dict(months)})
+    return read_counters(db)
+
+
+def _apply_rebuild(tx, before, rebuilt):
+    first, *rest = shard_ids()
+    after = tx.get_docs(COUNTERS, [first, *rest])
+    if after.get(first, {}).get('rebuilt_at') != before.get(first, {}).get('rebuilt_at'):
+        return  # Another rebuild landed during the scan; its baseline is as fresh as this one
+    counters = copy.deepcopy(rebuilt)
+    for shard in after.values():
+        add_values(counters, shard)
+    for shard in before.values():
+        add_values(counters, shard, sign=-1)
+    tx.set_doc(COUNTERS, first, {**counters, 'rebuilt_at': datetime.now().isoformat()})
+    for shard_id in rest:
+        tx.set_doc(COUNTERS, shard_id, {})
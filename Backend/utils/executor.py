@@ -0,0 +1,41 @@
+import asyncio
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+DB_WORKERS = int(os.getenv("CARIYA_DB_WORKERS", "32"))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Return the datastore executor, creating it on first use and again after a shutdown."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix="cariya-db")
+    return _executor
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking datastore call on the bounded executor so the event loop stays free.
+
+    The call runs in a copy of the caller's context, so per-request state such as the
+    datastore operation counters follows it onto the worker thread.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(get_executor(), partial(context.run, func, *args, **kwargs))
+
+
+def shutdown_executor():
+    """Stop the datastore executor, waiting for in-flight calls to finish; the next call starts a new one."""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
@@ -0,0 +1,192 @@
+"""Columnar (Parquet / Arrow IPC) export of users, monthly savings and monthly activities.
+
+Run from Backend/:  python -m utils.export --table savings --out exports/ [--format arrow] [--year 2025]
+Savings and activities are written as a dataset partitioned by month (month_key=YYYY-MM/).
+Users are paged through the store and converted one page at a time, so memory stays flat
+however many users there are. Needs pyarrow (pip install pyarrow).
+"""
+import argparse
+import os
+from utils.storage import create_store, MONTHLY_SAVINGS, MONTHLY_ACTIVITIES
+from utils.periods import current_month_key, month_range, parse_month_key
+
+EXPORT_PAGE_SIZE = int(os.getenv("CARIYA_EXPORT_PAGE_SIZE", "200"))  # Users read per page (one batched month read each)
+EXPORT_FORMATS = ('parquet', 'arrow')
+
+# Columns per table, with their Arrow types, mirroring the stored document fields
+EXPORT_TABLES = {
+    'users': [
+        ('user_id', 'string'), ('first_name', 'string'), ('surname', 'string'), ('num_children', 'int64'),
+        ('savings', 'float64'), ('donor_contributions', 'float64'), ('activity_points', 'int64'),
+        ('milestone_score', 'int64'), ('compliance_score', 'int64')
+    ],
+    'savings': [
+        ('user_id', 'string'), ('month_key', 'string'), ('savings', 'float64'),
+        ('milestone_score', 'int64'), ('donor_contribution', 'float64')
+    ],
+    'activities': [
+        ('user_id', 'string'), ('month_key', 'string'), ('activity', 'string'),
+        ('partner', 'string'), ('activity_points', 'int64')
+    ],
+}
+MONTH_COLLECTIONS = {'savings': MONTHLY_SAVINGS, 'activities': MONTHLY_ACTIVITIES}
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError("Exports need pyarrow: pip install pyarrow")
+    return pyarrow
+
+
+def export_schema(table):
+    """Return the Arrow schema of an export table."""
+    if table not in EXPORT_TABLES:
+        raise ValueError(f"Unknown export table {table}; expected one of {', '.join(EXPORT_TABLES)}")
+    pa = _pyarrow()
+    return pa.schema([(name, getattr(pa, type_name)()) for name, type_name in EXPORT_TABLES[table]])
+
+
+def export_month_keys(year=None, month=None):
+    """Return the month keys to export: one YYYY-MM month, or every month of a year (the current one by default)."""
+    if month is not None:
+        parse_month_key(month)
+        return [month]
+    year = year or parse_month_key(current_month_key())[0]
+    return month_range(f"{year}-01", f"{year}-12")
+
+
+def iter_rows(db, table, month_keys, page_size=EXPORT_PAGE_SIZE):
+    """Yield one list of row dicts per page of users."""
+    columns = [name for name, _ in EXPORT_TABLES[table]]
+    cursor = None
+    while True:
+        fields = columns[1:] if table == 'users' else []
+        users = db.list_users(limit=page_size, start_after=cursor, fields=fields)
+        if not users:
+            return
+        cursor = users[-1][0]
+
+        if table == 'users':
+            yield [{'user_id': user_id, **{column: user.get(column) for column in fields}} for user_id, user in users]
+            continue
+
+        months = db.get_months_for_users([user_id for user_id, _ in users], MONTH_COLLECTIONS[table], month_keys)
+        yield [
+            {'user_id': user_id, 'month_key': month_key, **{column: data.get(column) for column in columns[2:]}}
+            for user_id, user_months in months.items()
+            for month_key, data in sorted(user_months.items())
+        ]
+
+
+def iter_record_batches(db, table, month_keys, page_size=EXPORT_PAGE_SIZE):
+    """Yield the table as Arrow record batches, one per page of users with data."""
+    pa = _pyarrow()
+    schema = export_schema(table)
+    for rows in iter_rows(db, table, month_keys, page_size):
+        if rows:
+            yield pa.RecordBatch.from_pylist(rows, schema=schema)
+
+
+def write_export(db, table, out_dir, fmt='parquet', month_keys=None, page_size=EXPORT_PAGE_SIZE):
+    """Write a table under out_dir/table, partitioned by month for savings and activities; returns the row count."""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {fmt}; expected one of {', '.join(EXPORT_FORMATS)}")
+    import pyarrow.dataset as ds
+
+    schema = export_schema(table)
+    rows = 0
+
+    def counted(batches):
+        nonlocal rows
+        for batch in batches:
+            rows += batch.num_rows
+            yield batch
+
+    ds.write_dataset(
+        counted(iter_record_batches(db, table, month_keys or export_month_keys(), page_size)),
+        os.path.join(out_dir, table),
+        schema=schema,
+        format='parquet' if fmt == 'parquet' else 'ipc',
+        partitioning=['month_key'] if table in MONTH_COLLECTIONS else None,
+        partitioning_flavor='hive',
+        existing_data_behavior='delete_matching'
+    )
+    return rows
+
+
+class _ChunkSink:
+    """Write-only file object that hands back what has been written since the last drain."""
+
+    closed = False
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data):
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data, self.chunks = b''.join(self.chunks), []
+        return data
+
+
+def stream_export(db, table, fmt='arrow', month_keys=None, page_size=EXPORT_PAGE_SIZE):
+    """Return a generator of bytes encoding a table as one Arrow IPC stream or Parquet file.
+
+    The table, format and pyarrow are checked before the generator is returned, so bad
+    requests fail up front rather than mid-response.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {fmt}; expected one of {', '.join(EXPORT_FORMATS)}")
+    pa = _pyarrow()
+    schema = export_schema(table)
+    month_keys = month_keys or export_month_keys()
+
+    def generate():
+        sink = _ChunkSink()
+        if fmt == 'arrow':
+            writer = pa.ipc.new_stream(sink, schema)
+        else:
+            import pyarrow.parquet as pq
+
+            writer = pq.ParquetWriter(sink, schema, compression='zstd')
+        for batch in iter_record_batches(db, table, month_keys, page_size):
+            writer.write_batch(batch)  # One row group / stream message per page of users
+            yield sink.drain()
+        writer.close()
+        yield sink.drain()
+
+    return generate()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--table", default="all", choices=["all", *EXPORT_TABLES])
+    parser.add_argument("--out", default="exports")
+    parser.add_argument("--format", default="parquet", choices=EXPORT_FORMATS)
+    parser.add_argument("--year", type=int, default=None)
+    parser.add_argument("--month", default=None, help="Export a single YYYY-MM month")
+    parser.add_argument("--page-size", type=int, default=EXPORT_PAGE_SIZE)
+    args = parser.parse_args()
+
+    db = create_store()
+    month_keys = export_month_keys(args.year, args.month)
+    for table in EXPORT_TABLES if args.table == "all" else [args.table]:
+        rows = write_export(db, table, args.out, args.format, month_keys, args.page_size)
+        print(f"Exported {rows} {table} rows to {os.path.join(args.out, table)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+import pandas as pd
+from utils.unique_identifier_funcs import (
+    normalize_mobile_numbers, parse_children_ages, parse_children_ages_batch, count_children_ages, generate_unique_identifiers
+)
+from utils.helpers import build_user_document
+from utils.mobile_index import lookup_user_ids, register_user
+from utils.storage import BATCH_LIMIT, WriteConflict
+from utils.segments import segment_state, record_segment_changes
+from utils.counters import counter_changes, record_counters
+
+IMPORT_CHUNK_SIZE = 500  # Sheet rows validated and de-duplicated together
+# Users per batch: two creates each (user and index entry) plus the segment and counter merges fit one commit
+IMPORT_WRITE_ROWS = (BATCH_LIMIT - 2) // 2
+
+# Sheet headers (as in data/Mothers datasheet.xlsx) mapped to registration fields
+IMPORT_COLUMNS = {
+    'First name': 'first_name',
+    'Surname': 'surname',
+    'Mobile number': 'mobile_number',
+    'No.of children under 18': 'num_children',
+    'Ages of children per birth order': 'ages_of_children_per_birth_order'
+}
+
+
+def iter_sheet_chunks(fileobj, filename, chunk_size=IMPORT_CHUNK_SIZE):
+    """Yield the sheet as DataFrames of at most chunk_size rows, indexed by sheet row number.
+
+    CSV is read with pandas' chunked reader; .xlsx is streamed row by row with openpyxl's
+    read-only mode, so neither format is ever loaded whole.
+    """
+    if filename.lower().endswith('.csv'):
+        for chunk in pd.read_csv(fileobj, dtype=str, keep_default_na=False, chunksize=chunk_size):
+            chunk.index = chunk.index + 2  # Row 1 is the header
+            yield chunk
+        return
+
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [
+            str(value).strip() if value is not None else f"Unnamed: {position}"
+            for position, value in enumerate(next(rows, ()))
+        ]
+        chunk, row_numbers = [], []
+        for row_number, row in enumerate(rows, start=2):
+            if all(value is None for value in row):
+                continue
+            chunk.append(row)
+            row_numbers.append(row_number)
+            if len(chunk) == chunk_size:
+                yield pd.DataFrame(chunk, columns=header, index=row_numbers, dtype=object)
+                chunk, row_numbers = [], []
+        if chunk:
+            yield pd.DataFrame(chunk, columns=header, index=row_numbers, dtype=object)
+    finally:
+        workbook.close()
+
+
+def validate_chunk(chunk):
+    """Normalize and validate a chunk of sheet rows.
+
+    Returns a frame with first_name, surname, mobile_number, num_children, ages (canonical
+    '16,9,6' strings), generated_id and error columns; error is missing for rows that can be registered.
+    """
+    chunk = chunk.rename(columns=lambda column: IMPORT_COLUMNS.get(str(column).strip(), str(column).strip()))
+    missing = [header for header, field in IMPORT_COLUMNS.items() if field not in chunk.columns]
+    if missing:
+        raise ValueError(f"Sheet is missing required columns: {', '.join(missing)}")
+
+    rows = pd.DataFrame(index=chunk.index)
+    rows['first_name'] = chunk['first_name'].fillna('').astype(str).str.strip()
+    rows['surname'] = chunk['surname'].fillna('').astype(str).str.strip()
+    rows['mobile_number'], mobile_errors = normalize_mobile_numbers(chunk['mobile_number'])
+    rows['num_children'] = pd.to_numeric(chunk['num_children'], errors='coerce')
+    rows['ages'], age_errors = parse_children_ages_batch(chunk['ages_of_children_per_birth_order'])
+
+    # Earlier checks take precedence, so each row reports its first failure
+    errors = pd.Series(None, index=chunk.index, dtype=object)
+    checks = [
+        ((rows['first_name'] == '') | (rows['surname'] == ''), "First name and surname are required"),
+        (mobile_errors, "Invalid mobile number format: " + rows['mobile_number']),
+        (rows['num_children'].isna() | (rows['num_children'] % 1 != 0), "Number of children must be a whole number"),
+        (age_errors.notna(), age_errors),
+    ]
+    for failed, message in checks:
+        failed = failed & errors.isna()
+        errors[failed] = message[failed] if isinstance(message, pd.Series) else message
+
+    ok = errors.isna()
+    counts = count_children_ages(rows.loc[ok, 'ages'])
+    mismatched = counts[counts != rows.loc[ok, 'num_children']].index
+    errors.loc[mismatched] = "Number of children does not match ages provided"
+
+    ok = errors.isna()
+    rows['generated_id'] = None
+    rows.loc[ok, 'generated_id'] = generate_unique_identifiers(
+        rows.loc[ok, 'first_name'], rows.loc[ok, 'surname'], rows.loc[ok, 'mobile_number'],
+        rows.loc[ok, 'num_children'], rows.loc[ok, 'ages']
+    )
+    rows['error'] = errors
+    return rows
+
+
+def _conflict_error(conflict, user_id, mobile_number):
+    if conflict == 'mobile_number':
+        return f"Mobile number {mobile_number} is already registered"
+    return f"User with ID {user_id} already exists"
+
+
+def _create_users(db, rows, report):
+    """Create (sheet row, user_id, user) rows with create semantics, reporting rows whose keys are taken.
+
+    The rows are written in one batch. If another writer (a /register, another import)
+    took one of their ids or numbers since they were checked, the batch writes nothing
+    and each row is registered on its own, so only the conflicting rows fail.
+    """
+    try:
+        batch = db.batch()
+        for _, user_id, user in rows:
+            batch.create_user_with_index(user_id, user, user['mobile_number'])
+        record_segment_changes(batch, [(None, segment_state(user)) for _, _, user in rows])
+        record_counters(batch, counter_changes(mothers=len(rows)))
+        batch.commit()
+        report['imported'] += len(rows)
+        return
+    except WriteConflict:
+        pass
+
+    for row_number, user_id, user in rows:
+        conflict = register_user(db, user_id, user)
+        if conflict is None:
+            report['imported'] += 1
+        else:
+            report['errors'].append({"row": row_number, "error": _conflict_error(conflict, user_id, user['mobile_number'])})
+
+
+def import_beneficiaries(db, fileobj, filename, chunk_size=IMPORT_CHUNK_SIZE):
+    """Register every valid row of an uploaded sheet, returning counts and a per-row error report.
+
+    Users and their mobile index entries are created, never overwritten: a row whose
+    number or id is already registered, even by a /register racing the import, is
+    reported as an error.
+    """
+    report = {"rows_processed": 0, "imported": 0, "errors": []}
+    seen_mobiles, seen_ids = set(), set()
+
+    for chunk in iter_sheet_chunks(fileobj, filename, chunk_size):
+        rows = validate_chunk(chunk)
+        valid = rows[rows['error'].isna()]
+        existing_mobiles = lookup_user_ids(db, valid['mobile_number'])
+        existing_ids = db.get_users(set(valid['generated_id']))
+
+        to_create = []
+        for row in rows.itertuples():
+            error = row.error if isinstance(row.error, str) else None
+            if error is None and (row.mobile_number in existing_mobiles or row.mobile_number in seen_mobiles):
+                error = _conflict_error('mobile_number', row.generated_id, row.mobile_number)
+            elif error is None and (row.generated_id in existing_ids or row.generated_id in seen_ids):
+                error = _conflict_error('user_id', row.generated_id, row.mobile_number)
+            if error is not None:
+                report['errors'].append({"row": int(row.Index), "error": error})
+                continue
+
+            user = build_user_document(
+                row.first_name, row.surname, row.mobile_number, int(row.num_children), parse_children_ages(row.ages), row.generated_id
+            )
+            to_create.append((int(row.Index), row.generated_id, user))
+            seen_mobiles.add(row.mobile_number)
+            seen_ids.add(row.generated_id)
+        for start in range(0, len(to_create), IMPORT_WRITE_ROWS):
+            _create_users(db, to_create[start:start + IMPORT_WRITE_ROWS], report)
+        report['rows_processed'] += len(rows)
+
+    report['errors'].sort(key=lambda error: error['row'])
+    report['failed'] = len(report['errors'])
+    return report
@@ -0,0 +1,174 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from utils.scoring import resolve_scoring_months, score_users_concurrently
+from utils.logs import get_logger
+
+JOBS = 'jobs'
+JOB_LOCKS = 'job_locks'  # {job type}-{month_key}: {job_id} of the latest job for that month
+ACTIVE_STATUSES = ('queued', 'running')
+JOB_PAGE_SIZE = int(os.getenv("CARIYA_JOB_PAGE_SIZE", "1000"))  # Users per checkpointed chunk
+
+_job_executor = None  # Created by the first job, and again after stop_jobs
+_running = set()
+_running_lock = threading.Lock()
+_stopping = threading.Event()
+
+logger = get_logger("jobs")
+
+
+def create_scoring_job(db, target_month=None, workers=None, target_year=None):
+    """Persist a queued calculate-scores job; the months are fixed now so a resume scores the same period.
+
+    Returns (job, created). A month has at most one queued or running job: while one
+    exists it is returned with created=False instead of queueing another.
+    """
+    month_key, month_keys = resolve_scoring_months(target_month, target_year)
+    return db.run_transaction(_claim_scoring_job, month_key, month_keys, workers, db.count_users())
+
+
+def _claim_scoring_job(tx, month_key, month_keys, workers, total_users):
+    lock_id = f"calculate_scores-{month_key}"
+    lock = tx.get_doc(JOB_LOCKS, lock_id)
+    if lock is not None:
+        current = tx.get_doc(JOBS, lock['job_id'])
+        if current is not None and current['status'] in ACTIVE_STATUSES:
+            return current, False
+
+    now = datetime.now().isoformat()
+    job = {
+        "job_id": uuid.uuid4().hex,
+        "type": "calculate_scores",
+        "status": "queued",
+        "month_key": month_key,
+        "month_keys": month_keys,
+        "workers": workers,
+        "cursor": None,
+        "users_processed": 0,
+        "chunks_committed": 0,
+        "total_users": total_users,
+        "elapsed_seconds": 0.0,
+        "created_at": now,
+        "updated_at": now,
+        "finished_at": None,
+        "error": None
+    }
+    tx.set_doc(JOBS, job['job_id'], job)
+    tx.set_doc(JOB_LOCKS, lock_id, {"job_id": job['job_id']})
+    return job, True
+
+
+def _job_summary(job_id, status, processed, chunks, elapsed, errors=0):
+    return {
+        "job_id": job_id, "status": status, "users_processed": processed, "chunks_committed": chunks,
+        "elapsed_seconds": round(elapsed, 3), "users_per_second": round(processed / elapsed, 1) if elapsed > 0 else 0.0,
+        "errors": errors
+    }
+
+
+def run_scoring_job(db, job_id):
+    """Score users page by page from the job's cursor, checkpointing after each committed page.
+
+    Re-scoring a page is idempotent (donor matches credit only the unmatched amount, in a
+    transaction per user), so a job interrupted mid-page can simply be resumed from its
+    last checkpoint.
+    """
+    job = db.get_doc(JOBS, job_id)
+    cursor = job['cursor']
+    processed = job['users_processed']
+    chunks = job['chunks_committed']
+    elapsed = job['elapsed_seconds']
+    db.update_doc(JOBS, job_id, {"status": "running", "error": None, "updated_at": datetime.now().isoformat()})
+    logger.info("Scoring job started", extra={"job_id": job_id, "month_key": job['month_key'], "users_processed": processed})
+    try:
+        while not _stopping.is_set():
+            started = time.perf_counter()
+            users = db.list_users(limit=JOB_PAGE_SIZE, start_after=cursor)
+            if not users:
+                break
+            score_users_concurrently(db, users, job['month_key'], job['month_keys'], job['workers'])
+            cursor = users[-1][0]
+            processed += len(users)
+            chunks += 1
+            elapsed += time.perf_counter() - started
+            db.update_doc(JOBS, job_id, {
+                "cursor": cursor,
+                "users_processed": processed,
+                "chunks_committed": chunks,
+                "elapsed_seconds": elapsed,
+                "updated_at": datetime.now().isoformat()
+            })
+            logger.debug("Scoring job checkpoint", extra={"job_id": job_id, "users_processed": processed, "chunks_committed": chunks})
+        now = datetime.now().isoformat()
+        # Stopping after the last page still completes the job
+        remaining = _stopping.is_set() and bool(db.list_users(limit=1, start_after=cursor, fields=[]))
+        status = "interrupted" if remaining else "completed"
+        if status == "interrupted":
+            db.update_doc(JOBS, job_id, {"status": status, "updated_at": now})
+        else:
+            db.update_doc(JOBS, job_id, {"status": status, "updated_at": now, "finished_at": now})
+        logger.info(f"Scoring job {status}", extra=_job_summary(job_id, status, processed, chunks, elapsed))
+    except Exception as e:
+        db.update_doc(JOBS, job_id, {
+            "status": "failed",
+            "error": str(e),
+            "updated_at": datetime.now().isoformat()
+        })
+        logger.exception("Scoring job failed", extra=_job_summary(job_id, "failed", processed, chunks, elapsed, errors=1))
+    finally:
+        with _running_lock:
+            _running.discard(job_id)
+
+
+def start_job(db, job_id):
+    """Run a job on the background executor; returns False if it is already running here."""
+    global _job_executor
+    with _running_lock:
+        if job_id in _running:
+            return False
+        _running.add(job_id)
+        if _job_executor is None:
+            _job_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="cariya-jobs")
+        _job_executor.submit(run_scoring_job, db, job_id)
+    return True
+
+
+def get_job_status(db, job_id):
+    """Return a job with its progress percentage and throughput, or None if it does not exist."""
+    job = db.get_doc(JOBS, job_id)
+    if job is None:
+        return None
+    total = job['total_users']
+    elapsed = job['elapsed_seconds']
+    job['progress'] = round(100 * min(job['users_processed'] / total, 1), 1) if total else 100.0
+    job['users_per_second'] = round(job['users_processed'] / elapsed, 1) if elapsed > 0 else 0.0
+    return job
+
+
+def resume_job(db, job_id):
+    """Resume a failed or interrupted job from its last checkpoint."""
+    job = db.get_doc(JOBS, job_id)
+    if job is None:
+        return None
+    if job['status'] == 'completed':
+        raise ValueError(f"Job {job_id} has already completed")
+    if not start_job(db, job_id):
+        raise ValueError(f"Job {job_id} is already running")
+    return job
+
+
+def stop_jobs():
+    """Ask running jobs to stop after their current page and wait for them; they are left resumable.
+
+    Jobs started afterwards (e.g. by the application's next lifespan) run normally.
+    """
+    global _job_executor
+    _stopping.set()
+    with _running_lock:
+        executor, _job_executor = _job_executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+    _stopping.clear()
@@ -0,0 +1,246 @@
+"""Append-only ledger of the money credited to each user, with periodic snapshots.
+
+Every deposit and donor match is written as an immutable event document under
+users/{id}/ledger, in the same transaction as the balances it changes, so an event is
+never recorded without its balance or the other way round. Event ids start with a
+nanosecond timestamp, so events never overwrite one another and sort in time order.
+
+Scope: the ledger is an audit log, not the read path. The balances on the user and
+monthly_savings documents stay as the projection that reads are served from, because the
+summary, scores, segments and donor view are all built on them. So a deposit still
+updates the user document in its transaction, as well as appending its event. The
+ledger is what the projection is audited against and rebuilt from
+(summary.rebuild_balances_from_ledger).
+
+A user's balance is their latest snapshot plus the events after it. A snapshot only
+covers events older than CARIYA_LEDGER_SETTLE_SECONDS, so an event committed late
+(clock skew, a slow transaction) can never sort before a snapshot that skipped it.
+Replays are bounded by CARIYA_LEDGER_SNAPSHOT_EVERY events.
+
+Run from Backend/:  python -m utils.ledger --backfill   (opening balances for existing users)
+                    python -m utils.ledger --snapshot   (snapshot every user's settled events)
+                    python -m utils.ledger --verify     (report users whose balances differ)
+"""
+import argparse
+import os
+import time
+import uuid
+from datetime import datetime
+from utils.storage import create_store, MONTHLY_SAVINGS
+
+LEDGER = 'ledger'  # users/{id}/ledger/{event_id}: {kind, month_key, amount, at}
+LEDGER_SNAPSHOTS = 'ledger_snapshots'  # {user_id: {through, events, savings, donor_contributions, months, taken_at}}
+LEDGER_SNAPSHOT_EVERY = int(os.getenv("CARIYA_LEDGER_SNAPSHOT_EVERY", "100"))  # Settled events replayed before a new snapshot
+LEDGER_SETTLE_SECONDS = int(os.getenv("CARIYA_LEDGER_SETTLE_SECONDS", "300"))
+OPENING_EVENT_ID = '0' * 20 + '-opening'  # Sorts before every timestamped event
+_END_OF_LOG = '~'  # Sorts after every event id
+
+
+def new_event_id(now_ns=None):
+    """Return a unique event id that sorts by creation time."""
+    return f"{now_ns or time.time_ns():020d}-{uuid.uuid4().hex[:8]}"
+
+
+def append_event(target, user_id, kind, month_key, amount, in_total=True):
+    """Write a 'deposit' or 'donor_match' event through a store, batch or transaction.
+
+    in_total=False records a deposit that changed the month's savings but not the user's
+    total, as PUT-style corrections through update_savings do.
+    """
+    event = {'kind': kind, 'month_key': month_key, 'amount': amount, 'at': datetime.now().isoformat()}
+    if not in_total:
+        event['in_total'] = False
+    target.set_month(user_id, LEDGER, new_event_id(), event)
+
+
+def empty_balance():
+    return {'savings': 0.0, 'donor_contributions': 0.0, 'months': {}}
+
+
+def apply_event(balance, event):
+    """Fold one event into a balance in place."""
+    if event['kind'] == 'opening':
+        balance['savings'] += event['savings']
+        balance['donor_contributions'] += event['donor_contributions']
+        for month_key, opening in event['months'].items():
+            month = balance['months'].setdefault(month_key, {'savings': 0.0, 'donor_contribution': 0.0})
+            month['savings'] += opening['savings']
+            month['donor_contribution'] += opening['donor_contribution']
+        return balance
+
+    month = balance['months'].setdefault(event['month_key'], {'savings': 0.0, 'donor_contribution': 0.0})
+    if event['kind'] == 'deposit':
+        month['savings'] += event['amount']
+        if event.get('in_total', True):
+            balance['savings'] += event['amount']
+    elif event['kind'] == 'donor_match':
+        month['donor_contribution'] += event['amount']
+        balance['donor_contributions'] += event['amount']
+        balance['savings'] += event['amount']  # Matches are credited to the mother's total savings
+    else:
+        raise ValueError(f"Unknown ledger event kind {event['kind']}")
+    return balance
+
+
+def read_events(db, user_id, after=None):
+    """Return {event_id: event} for a user's events after the given id (all of them by default), in order."""
+    events = db.get_month_range(user_id, LEDGER, after, _END_OF_LOG)
+    events.pop(after, None)  # The range is inclusive
+    return dict(sorted(events.items()))
+
+
+def _settled(event_id, now_ns):
+    return int(event_id.split('-')[0]) <= now_ns - LEDGER_SETTLE_SECONDS * 10**9
+
+
+def take_snapshot(db, user_id, snapshot, tail, now_ns=None):
+    """Fold the settled part of the tail into a new snapshot and store it; returns it."""
+    now_ns = now_ns or time.time_ns()
+    snapshot = {
+        'through': snapshot.get('through'), 'events': snapshot.get('events', 0),
+        **{key: snapshot.get(key, value) for key, value in empty_balance().items()}
+    }
+    for event_id, event in tail.items():
+        if not _settled(event_id, now_ns):
+            break
+        apply_event(snapshot, event)
+        snapshot['through'] = event_id
+        snapshot['events'] += 1
+    snapshot['taken_at'] = datetime.now().isoformat()
+    db.set_doc(LEDGER_SNAPSHOTS, user_id, snapshot)
+    return snapshot
+
+
+def ledger_balance(db, user_id, snapshot_every=LEDGER_SNAPSHOT_EVERY, take_snapshots=True):
+    """Return a user's balance as snapshot + tail-of-log, snapshotting first when the tail has grown long.
+
+    take_snapshots=False never writes, for read-only callers such as audits. The balance has savings, donor_contributions, months ({month_key: {savings,
+    donor_contribution}}), events (how many it covers), tail (how many were replayed after
+    the snapshot) and snapshot_through (the last event the snapshot covers).
+    """
+    snapshot = db.get_doc(LEDGER_SNAPSHOTS, user_id) or {}
+    tail = read_events(db, user_id, snapshot.get('through'))
+    if take_snapshots and len(tail) >= snapshot_every:
+        now_ns = time.time_ns()
+        if sum(1 for event_id in tail if _settled(event_id, now_ns)) >= snapshot_every:
+            snapshot = take_snapshot(db, user_id, snapshot, tail, now_ns)
+            tail = {event_id: event for event_id, event in tail.items() if event_id > snapshot['through']}
+
+    balance = empty_balance()
+    balance.update({key: snapshot[key] for key in balance if key in snapshot})
+    balance['months'] = {month_key: dict(month) for month_key, month in balance['months'].items()}
+    for event in tail.values():
+        apply_event(balance, event)
+    balance.update({'events': snapshot.get('events', 0) + len(tail), 'tail': len(tail), 'snapshot_through': snapshot.get('through')})
+    return balance
+
+
+def materialized_balance(user, savings_months):
+    """Return the balance the projection currently shows, in ledger_balance's shape."""
+    return {
+        'savings': user.get('savings', 0.0),
+        'donor_contributions': user.get('donor_contributions', 0.0),
+        'months': {
+            month_key: {'savings': data.get('savings', 0.0), 'donor_contribution': data.get('donor_contribution', 0.0)}
+            for month_key, data in savings_months.items()
+        }
+    }
+
+
+def balance_discrepancies(ledger, materialized, tolerance=1e-6):
+    """Return {field: {ledger, materialized}} for every balance the two disagree on."""
+    differences = {}
+    for field in ('savings', 'donor_contributions'):
+        if abs(ledger[field] - materialized[field]) > tolerance:
+            differences[field] = {'ledger': ledger[field], 'materialized': materialized[field]}
+    for month_key in sorted(set(ledger['months']) | set(materialized['months'])):
+        for field in ('savings', 'donor_contribution'):
+            from_ledger = ledger['months'].get(month_key, {}).get(field, 0.0)
+            from_projection = materialized['months'].get(month_key, {}).get(field, 0.0)
+            if abs(from_ledger - from_projection) > tolerance:
+                differences[f"{month_key}.{field}"] = {'ledger': from_ledger, 'materialized': from_projection}
+    return differences
+
+
+def audit_user(db, user_id):
+    """Compare a user's ledger balance with the projection; returns (balance, discrepancies), or None for no user.
+
+    Only reads: no snapshot is taken, however long the tail.
+    """
+    user = db.get_user(user_id)
+    if user is None:
+        return None
+    balance = ledger_balance(db, user_id, take_snapshots=False)
+    return balance, balance_discrepancies(balance, materialized_balance(user, db.get_months(user_id, MONTHLY_SAVINGS)))
+
+
+def backfill_opening_balance(db, user_id, user):
+    """Record what the projection holds beyond the user's events as their opening balance.
+
+    Balances credited before the ledger existed become one opening event that sorts
+    first. Re-running it only tops the opening event up to the current difference.
+    """
+    events = read_events(db, user_id)
+    events.pop(OPENING_EVENT_ID, None)
+    from_events = empty_balance()
+    for event in events.values():
+        apply_event(from_events, event)
+    materialized = materialized_balance(user, db.get_months(user_id, MONTHLY_SAVINGS))
+
+    opening = {
+        'kind': 'opening',
+        'savings': materialized['savings'] - from_events['savings'],
+        'donor_contributions': materialized['donor_contributions'] - from_events['donor_contributions'],
+        'months': {},
+        'at': datetime.now().isoformat()
+    }
+    for month_key, month in materialized['months'].items():
+        logged = from_events['months'].get(month_key, {'savings': 0.0, 'donor_contribution': 0.0})
+        difference = {field: month[field] - logged[field] for field in ('savings', 'donor_contribution')}
+        if any(difference.values()):
+            opening['months'][month_key] = difference
+    if not (opening['savings'] or opening['donor_contributions'] or opening['months']):
+        return False
+    db.set_month(user_id, LEDGER, OPENING_EVENT_ID, opening)
+    db.set_doc(LEDGER_SNAPSHOTS, user_id, {})  # The opening event changes history, so replay it from the start
+    return True
+
+
+def _each_user(db, fields=None, page_size=500):
+    cursor = None
+    while True:
+        users = db.list_users(limit=page_size, start_after=cursor, fields=fields)
+        if not users:
+            return
+        yield from users
+        cursor = users[-1][0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument("--backfill", action="store_true", help="Record existing balances as opening events")
+    action.add_argument("--snapshot", action="store_true", help="Snapshot every user with settled events since their last snapshot")
+    action.add_argument("--verify", action="store_true", help="List users whose projection differs from their ledger")
+    args = parser.parse_args()
+
+    db = create_store()
+    if args.backfill:
+        backfilled = sum(backfill_opening_balance(db, user_id, user) for user_id, user in _each_user(db, ['savings', 'donor_contributions']))
+        print(f"Recorded opening balances for {backfilled} users")
+    elif args.snapshot:
+        for user_id, _ in _each_user(db, []):
+            ledger_balance(db, user_id, snapshot_every=1)
+        print("Snapshots up to date")
+    else:
+        mismatched = 0
+        for user_id, _ in _each_user(db, []):
+            _, differences = audit_user(db, user_id)
+            if differences:
+                mismatched += 1
+                print(user_id, differences)
+        print(f"{mismatched} users differ from their ledger")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+"""Live per-user changes for donor clients, streamed as Server-Sent Events.
+
+The savings, activity and scoring paths publish a delta for each user they change: the
+donor-view fields that changed, with their new values. Clients apply deltas to the rows
+they hold from /donor-view instead of re-fetching it. The feed keeps the last
+CARIYA_LIVE_BUFFER_SIZE events in memory. A client that reconnects with the id of the
+last event it saw (the Last-Event-ID header) gets every event it missed. A client whose
+id has left the buffer, or belongs to another process, is told to reload.
+
+With CARIYA_LIVE_BACKEND=redis, events are appended to a Redis stream that every worker
+relays into its buffer. Subscribers then see writes made through any worker, and event
+ids are valid on all of them.
+"""
+import asyncio
+import json
+import os
+import threading
+import uuid
+from collections import deque
+from itertools import islice
+from utils.storage import SUMMARY, Increment
+from utils.logs import get_logger
+
+LIVE_BUFFER_SIZE = int(os.getenv("CARIYA_LIVE_BUFFER_SIZE", "10000"))  # Events a reconnecting client can catch up on
+LIVE_KEEPALIVE_SECONDS = float(os.getenv("CARIYA_LIVE_KEEPALIVE_SECONDS", "15"))
+LIVE_STREAM = 'cariya:live'  # Redis stream shared by the workers
+MAX_EVENTS_PER_MESSAGE = 500
+# User fields a delta carries, under their donor-view names
+DELTA_FIELDS = {
+    'savings': 'total_savings',
+    'donor_contributions': 'total_donor_contributions',
+    'activity_points': 'activity_points',
+    'compliance_score': 'compliance_score'
+}
+
+logger = get_logger("live")
+
+
+def user_delta(user_id, user, fields):
+    """Return the donor-view changes an update makes to a user, or None if it changes nothing donors see.
+
+    user is the document the update was applied to and fields the update itself (dotted
+    keys and Increments as passed to update_user). The delta has user_id, the changed
+    DELTA_FIELDS, and monthly_data ({month_key: {user_savings, donor_contribution}}) for
+    changed months with savings.
+    """
+    delta = {}
+    summary_fields = {}
+    for key, value in fields.items():
+        field = key.split('.')[0]
+        if field in DELTA_FIELDS:
+            delta[DELTA_FIELDS[field]] = user.get(field, 0) + value.amount if isinstance(value, Increment) else value
+        elif field == SUMMARY:
+            summary_fields[key] = value
+
+    if summary_fields:
+        months = {key.split('.')[1] for key in summary_fields if '.' in key}
+        if SUMMARY in summary_fields:
+            months.update(summary_fields[SUMMARY])
+        summary = {month_key: dict(user.get(SUMMARY, {}).get(month_key, {})) for month_key in months}
+        for key, value in summary_fields.items():
+            if key == SUMMARY:
+                summary.update(value)
+                continue
+            _, month_key, *rest = key.split('.')
+            if rest:
+                summary[month_key][rest[0]] = value
+            else:
+                summary[month_key] = dict(value)
+        monthly_data = {
+            month_key: {"user_savings": entry['savings'], "donor_contribution": entry.get('donor_contribution', 0.0)}
+            for month_key, entry in sorted(summary.items()) if 'savings' in entry
+        }
+        if monthly_data:
+            delta['monthly_data'] = monthly_data
+
+    return {'user_id': user_id, **delta} if delta else None
+
+
+def coalesce(deltas):
+    """Merge deltas for the same user, later values winning, in order of each user's last change."""
+    merged = {}
+    for delta in deltas:
+        current = merged.pop(delta['user_id'], {})
+        monthly_data = {**current.get('monthly_data', {}), **delta.get('monthly_data', {})}
+        current.update(delta)
+        if monthly_data:
+            current['monthly_data'] = monthly_data
+        merged[delta['user_id']] = current
+    return list(merged.values())
+
+
+class ChangeFeed:
+    """The most recent events in order, waking the subscribers waiting for new ones."""
+
+    def __init__(self, size):
+        self.size = size
+        self.published = 0
+        self._events = deque()  # (event_id, delta)
+        self._head = None  # Id of the event just before the oldest buffered one
+        self._waiters = set()  # (event loop, asyncio.Event) of each subscriber
+        self._lock = threading.Lock()
+
+    def reset(self, head):
+        """Empty the buffer, continuing after the given event id."""
+        with self._lock:
+            self._events.clear()
+            self._head = head
+
+    def append(self, events):
+        """Buffer (event_id, delta) pairs and wake every subscriber."""
+        with self._lock:
+            for event in events:
+                if len(self._events) >= self.size:
+                    self._head = self._events.popleft()[0]
+                self._events.append(event)
+            self.published += len(events)
+            waiters = list(self._waiters)
+        for loop, wake in waiters:
+            loop.call_soon_threadsafe(wake.set)
+
+    def last_id(self):
+        with self._lock:
+            return self._events[-1][0] if self._events else self._head
+
+    def read(self, after, limit=MAX_EVENTS_PER_MESSAGE):
+        """Return up to limit events after the given id, or None if the id is no longer (or never was) buffered."""
+        with self._lock:
+            if after == self._head:
+                return list(islice(self._events, limit))
+            for index in range(len(self._events) - 1, -1, -1):
+                if self._events[index][0] == after:
+                    return list(islice(self._events, index + 1, index + 1 + limit))
+            return None
+
+    def subscribe(self, waiter):
+        with self._lock:
+            self._waiters.add(waiter)
+
+    def unsubscribe(self, waiter):
+        with self._lock:
+            self._waiters.discard(waiter)
+
+    def stats(self):
+        with self._lock:
+            return {"subscribers": len(self._waiters), "published": self.published, "buffered": len(self._events)}
+
+
+class MemoryFeedBackend:
+    """Events published through this worker, streamed to this worker's subscribers."""
+
+    def __init__(self, feed):
+        self.feed = feed
+        self.epoch = uuid.uuid4().hex[:8]  # Ids from an earlier process never match this one's
+        self._sequence = 0
+        self._lock = threading.Lock()
+        feed.reset(f"{self.epoch}-0")
+
+    def publish(self, deltas):
+        with self._lock:  # Held while appending, so events are buffered in id order
+            events = []
+            for delta in deltas:
+                self._sequence += 1
+                events.append((f"{self.epoch}-{self._sequence}", delta))
+            self.feed.append(events)
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+
+class RedisFeedBackend:
+    """Events appended to a Redis stream, which a thread in each worker relays into its feed."""
+
+    def __init__(self, feed, url):
+        import redis
+
+        self.feed = feed
+        self.client = redis.Redis.from_url(url)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def publish(self, deltas):
+        pipeline = self.client.pipeline(transaction=False)
+        for delta in deltas:
+            pipeline.xadd(LIVE_STREAM, {'delta': json.dumps(delta)}, maxlen=self.feed.size, approximate=True)
+        pipeline.execute()
+
+    def start(self):
+        latest = self.client.xrevrange(LIVE_STREAM, count=1)
+        self.feed.reset(latest[0][0].decode() if latest else '0-0')
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._relay, name="cariya-live-relay", daemon=True)
+        self._thread.start()
+
+    def _relay(self):
+        last = self.feed.last_id()
+        while not self._stop.is_set():
+            try:
+                response = self.client.xread({LIVE_STREAM: last}, count=MAX_EVENTS_PER_MESSAGE, block=1000)
+            except Exception:
+                logger.exception("Live feed relay failed")
+                self._stop.wait(1)
+                continue
+            for _, entries in response or ():
+                events = [(event_id.decode(), json.loads(fields[b'delta'])) for event_id, fields in entries]
+                self.feed.append(events)
+                last = events[-1][0]
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+def create_live_backend(feed):
+    """Build the backend selected by CARIYA_LIVE_BACKEND ('memory' by default, or 'redis' with CARIYA_REDIS_URL)."""
+    backend = os.getenv("CARIYA_LIVE_BACKEND", "memory")
+    if backend == "memory":
+        return MemoryFeedBackend(feed)
+    if backend == "redis":
+        return RedisFeedBackend(feed, os.getenv("CARIYA_REDIS_URL", "redis://localhost:6379/0"))
+    raise ValueError(f"Unknown live feed backend: {backend}")
+
+
+live_feed = ChangeFeed(LIVE_BUFFER_SIZE)
+live_backend = create_live_backend(live_feed)
+
+
+def publish_deltas(deltas):
+    """Publish user deltas from a write path, once its write has committed; None entries are skipped."""
+    deltas = [delta for delta in deltas if delta is not None]
+    if not deltas:
+        return
+    try:
+        live_backend.publish(deltas)
+    except Exception:
+        logger.exception("Publishing live changes failed", extra={"users": len(deltas)})  # The write itself succeeded
+
+
+def start_live_feed():
+    live_backend.start()
+
+
+def stop_live_feed():
+    live_backend.stop()
+
+
+def _message(event, data, event_id):
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data, separators=(',', ':'), default=str)}\n\n"
+
+
+async def stream_deltas(after=None, keepalive=LIVE_KEEPALIVE_SECONDS):
+    """Yield Server-Sent Events: the changes after the given event id, then new ones as they are published.
+
+    Without an id the stream starts now, with a 'ready' event carrying the current id.
+    Changes arrive as 'deltas' events whose data is a list of user deltas. A 'reset' event
+    means the id could not be resumed from, and the client should reload /donor-view.
+    """
+    wake = asyncio.Event()
+    waiter = (asyncio.get_running_loop(), wake)
+    live_feed.subscribe(waiter)
+    try:
+        if after is None:
+            after = live_feed.last_id()
+            yield _message('ready', {}, after)
+        while True:
+            wake.clear()
+            events = live_feed.read(after)
+            if events is None:
+                after = live_feed.last_id()
+                yield _message('reset', {"reload": "/donor-view"}, after)
+            elif events:
+                after = events[-1][0]
+                yield _message('deltas', coalesce(delta for _, delta in events), after)
+            else:
+                try:
+                    await asyncio.wait_for(wake.wait(), keepalive)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+    finally:
+        live_feed.unsubscribe(waiter)
@@ -0,0 +1,94 @@
+"""Structured JSON-lines logging that does not block the caller.
+
+Records from the "cariya" loggers go onto an in-memory queue (QueueHandler) and a
+background QueueListener formats them as one JSON object per line and writes them to
+stdout. A worker thread in a hot loop therefore only pays for an enqueue. Keyword fields
+passed with extra={...} become top-level JSON keys. Per-user detail is sampled with
+sampled() at CARIYA_LOG_SAMPLE_RATE.
+"""
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_LEVEL = os.getenv("CARIYA_LOG_LEVEL", "INFO").upper()
+LOG_SAMPLE_RATE = float(os.getenv("CARIYA_LOG_SAMPLE_RATE", "0.01"))  # Share of per-user records that are logged
+
+_RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Format a record as one JSON line, with its extra fields as top-level keys."""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update({key: value for key, value in vars(record).items() if key not in _RESERVED})
+        if record.exc_text or record.exc_info:
+            entry["exception"] = record.exc_text or self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class _RecordQueueHandler(QueueHandler):
+    """Enqueue records with their message and traceback rendered but their extra fields kept intact."""
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None  # Keep queued records from holding the failing frames alive
+        return record
+
+
+def get_logger(name):
+    """Return the logger for a module, under the "cariya" hierarchy."""
+    return logging.getLogger(f"cariya.{name}")
+
+
+def sampled(rate=None):
+    """Return True for the share of calls that should log per-item detail."""
+    rate = LOG_SAMPLE_RATE if rate is None else rate
+    return rate >= 1 or random.random() < rate
+
+
+def configure_logging(stream=None):
+    """Route the "cariya" loggers through a queue to a JSON-lines handler; safe to call more than once."""
+    global _listener
+    if _listener is not None:
+        return
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(JsonFormatter())
+    records = queue.SimpleQueue()
+    root = logging.getLogger("cariya")
+    root.setLevel(LOG_LEVEL)
+    root.addHandler(_RecordQueueHandler(records))
+    root.propagate = False
+    _listener = QueueListener(records, handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Flush queued records and stop the background writer."""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    _listener = None
+    root = logging.getLogger("cariya")
+    for handler in [h for h in root.handlers if isinstance(h, QueueHandler)]:
+        root.removeHandler(handler)
+    root.propagate = True
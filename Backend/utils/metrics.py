@@ -0,0 +1,297 @@
+"""Request and datastore instrumentation, exposed in Prometheus text format at /metrics.
+
+The store is wrapped so every call is counted as document reads, writes and queries, as
+Firestore bills them. Counts go into process-wide totals and into the current request's
+counters, which the HTTP middleware turns into per-route totals. Requests slower than
+CARIYA_SLOW_REQUEST_MS (0 disables) are logged with their operations broken down by the
+helper function that issued them.
+"""
+import math
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from utils.storage import IN_QUERY_LIMIT
+from utils.logs import get_logger
+
+SLOW_REQUEST_MS = float(os.getenv("CARIYA_SLOW_REQUEST_MS", "1000"))
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+logger = get_logger("metrics")
+
+_lock = threading.Lock()
+_operations = defaultdict(lambda: {'reads': 0, 'writes': 0, 'queries': 0})  # {store operation: counts}
+_routes = defaultdict(lambda: {
+    'requests': defaultdict(int), 'buckets': [0] * len(LATENCY_BUCKETS), 'seconds': 0.0,
+    'reads': 0, 'writes': 0, 'queries': 0
+})  # {(method, route): totals}
+_request_ops = ContextVar('request_ops', default=None)
+
+_INTERNAL_FILES = ('metrics.py', 'storage.py', 'executor.py', 'thread.py', 'threading.py')
+
+
+def _helper_name():
+    """Name the innermost application function outside the store layer that issued the current operation."""
+    frame = sys._getframe(3)
+    while frame is not None:
+        if not frame.f_code.co_filename.endswith(_INTERNAL_FILES):
+            return frame.f_code.co_name
+        frame = frame.f_back
+    return 'handler'  # Called straight from a route through run_blocking
+
+
+def _record(operation, reads=0, writes=0, queries=0):
+    ops = _request_ops.get()
+    counted = [_operations[operation]]
+    if ops is not None:
+        counted += [ops, ops['by_helper'][_helper_name()]]
+    with _lock:  # Bulk writes record from several worker threads into one request's counters
+        for counts in counted:
+            counts['reads'] += reads
+            counts['writes'] += writes
+            counts['queries'] += queries
+
+
+def _query_reads(result):
+    return max(1, len(result))  # A query is billed at least one read even when it matches nothing
+
+
+class _InstrumentedWrites:
+    """Counts one write per write method called on the wrapped batch or transaction."""
+
+    WRITES = {
+        'create_user': 1, 'create_user_with_index': 2, 'update_user': 1, 'set_month': 1, 'update_month': 1,
+        'set_doc': 1, 'update_doc': 1, 'merge_doc': 1
+    }
+
+    def __init__(self, target, prefix):
+        self._target = target
+        self._prefix = prefix
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if name not in self.WRITES:
+            return attr
+
+        def write(*args, **kwargs):
+            _record(f"{self._prefix}.{name}", writes=self.WRITES[name])
+            return attr(*args, **kwargs)
+        return write
+
+
+class _InstrumentedTransaction(_InstrumentedWrites):
+    def get_user(self, user_id):
+        _record("transaction.get_user", reads=1)
+        return self._target.get_user(user_id)
+
+    def get_month(self, user_id, collection, month_key):
+        _record("transaction.get_month", reads=1)
+        return self._target.get_month(user_id, collection, month_key)
+
+    def get_doc(self, collection, doc_id):
+        _record("transaction.get_doc", reads=1)
+        return self._target.get_doc(collection, doc_id)
+
+    def get_docs(self, collection, doc_ids):
+        doc_ids = list(doc_ids)
+        _record("transaction.get_docs", reads=len(doc_ids))
+        return self._target.get_docs(collection, doc_ids)
+
+
+class InstrumentedStore:
+    """Store wrapper that counts the reads, writes and queries of every call before delegating it."""
+
+    def __init__(self, store):
+        self.store = store
+
+    def get_user(self, user_id):
+        _record("get_user", reads=1)
+        return self.store.get_user(user_id)
+
+    def get_users(self, user_ids):
+        user_ids = list(user_ids)
+        _record("get_users", reads=len(user_ids))
+        return self.store.get_users(user_ids)
+
+    def create_user(self, user_id, data):
+        _record("create_user", writes=1)
+        return self.store.create_user(user_id, data)
+
+    def update_user(self, user_id, fields):
+        _record("update_user", writes=1)
+        return self.store.update_user(user_id, fields)
+
+    def create_user_with_index(self, user_id, data, mobile_number):
+        _record("create_user_with_index", reads=2, writes=2)
+        return self.store.create_user_with_index(user_id, data, mobile_number)
+
+    def find_user_by_mobile(self, mobile_number):
+        _record("find_user_by_mobile", reads=1, queries=1)
+        return self.store.find_user_by_mobile(mobile_number)
+
+    def find_users_by_mobiles(self, mobile_numbers):
+        mobile_numbers = list(mobile_numbers)
+        found = self.store.find_users_by_mobiles(mobile_numbers)
+        queries = math.ceil(len(mobile_numbers) / IN_QUERY_LIMIT)
+        _record("find_users_by_mobiles", reads=max(queries, len(found)), queries=queries)
+        return found
+
+    def list_users(self, limit=None, start_after=None, fields=None):
+        users = self.store.list_users(limit, start_after, fields)
+        _record("list_users", reads=_query_reads(users), queries=1)
+        return users
+
+    def count_users(self):
+        _record("count_users", reads=1, queries=1)
+        return self.store.count_users()
+
+    def get_month(self, user_id, collection, month_key):
+        _record("get_month", reads=1)
+        return self.store.get_month(user_id, collection, month_key)
+
+    def get_months(self, user_id, collection):
+        months = self.store.get_months(user_id, collection)
+        _record("get_months", reads=_query_reads(months), queries=1)
+        return months
+
+    def get_month_range(self, user_id, collection, start_key, end_key):
+        months = self.store.get_month_range(user_id, collection, start_key, end_key)
+        _record("get_month_range", reads=_query_reads(months), queries=1)
+        return months
+
+    def get_months_for_users(self, user_ids, collection, month_keys):
+        _record("get_months_for_users", reads=len(user_ids) * len(month_keys))
+        return self.store.get_months_for_users(user_ids, collection, month_keys)
+
+    def set_month(self, user_id, collection, month_key, data):
+        _record("set_month", writes=1)
+        return self.store.set_month(user_id, collection, month_key, data)
+
+    def update_month(self, user_id, collection, month_key, fields):
+        _record("update_month", writes=1)
+        return self.store.update_month(user_id, collection, month_key, fields)
+
+    def get_doc(self, collection, doc_id):
+        _record("get_doc", reads=1)
+        return self.store.get_doc(collection, doc_id)
+
+    def get_docs(self, collection, doc_ids):
+        doc_ids = list(doc_ids)
+        _record("get_docs", reads=len(doc_ids))
+        return self.store.get_docs(collection, doc_ids)
+
+    def set_doc(self, collection, doc_id, data):
+        _record("set_doc", writes=1)
+        return self.store.set_doc(collection, doc_id, data)
+
+    def update_doc(self, collection, doc_id, fields):
+        _record("update_doc", writes=1)
+        return self.store.update_doc(collection, doc_id, fields)
+
+    def merge_doc(self, collection, doc_id, fields):
+        _record("merge_doc", writes=1)
+        return self.store.merge_doc(collection, doc_id, fields)
+
+    def batch(self):
+        return _InstrumentedWrites(self.store.batch(), "batch")
+
+    def run_transaction(self, func, *args):
+        return self.store.run_transaction(lambda tx, *a: func(_InstrumentedTransaction(tx, "transaction"), *a), *args)
+
+
+def instrument_store(store):
+    """Wrap a store so its operations are counted."""
+    return InstrumentedStore(store)
+
+
+def _observe_request(method, route, status, seconds, ops):
+    with _lock:
+        totals = _routes[(method, route)]
+        totals['requests'][status] += 1
+        totals['seconds'] += seconds
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                totals['buckets'][i] += 1
+        for kind in ('reads', 'writes', 'queries'):
+            totals[kind] += ops[kind]
+
+
+async def metrics_middleware(request, call_next):
+    """Time each request and attribute the datastore operations it caused to its route."""
+    ops = {'reads': 0, 'writes': 0, 'queries': 0, 'by_helper': defaultdict(lambda: {'reads': 0, 'writes': 0, 'queries': 0})}
+    token = _request_ops.set(ops)
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        seconds = time.perf_counter() - started
+        _request_ops.reset(token)
+        route = getattr(request.scope.get('route'), 'path', 'unmatched')  # The template, e.g. /users/{unique_id}
+        _observe_request(request.method, route, status, seconds, ops)
+        if SLOW_REQUEST_MS and seconds * 1000 >= SLOW_REQUEST_MS:
+            logger.warning("Slow request", extra={
+                "method": request.method, "path": request.url.path, "route": route, "status": status,
+                "duration_ms": round(seconds * 1000, 1),
+                "reads": ops['reads'], "writes": ops['writes'], "queries": ops['queries'],
+                "by_helper": dict(ops['by_helper'])
+            })
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}"
+
+
+def render_metrics(extra=()):
+    """Return all metrics in Prometheus text exposition format.
+
+    extra is (name, help, type, value) gauges/counters; value is a number, or a list of
+    (labels, number) samples.
+    """
+    lines = []
+    with _lock:
+        lines += [
+            "# HELP cariya_http_requests_total HTTP requests by route and status.",
+            "# TYPE cariya_http_requests_total counter",
+        ]
+        for (method, route), totals in sorted(_routes.items()):
+            for status, count in sorted(totals['requests'].items()):
+                lines.append(f"cariya_http_requests_total{_labels(method=method, route=route, status=status)} {count}")
+
+        lines += [
+            "# HELP cariya_http_request_duration_seconds HTTP request latency by route.",
+            "# TYPE cariya_http_request_duration_seconds histogram",
+        ]
+        for (method, route), totals in sorted(_routes.items()):
+            count = sum(totals['requests'].values())
+            for bound, observed in zip(LATENCY_BUCKETS, totals['buckets']):
+                lines.append(f"cariya_http_request_duration_seconds_bucket{_labels(method=method, route=route, le=bound)} {observed}")
+            lines.append(f"cariya_http_request_duration_seconds_bucket{_labels(method=method, route=route, le='+Inf')} {count}")
+            lines.append(f"cariya_http_request_duration_seconds_sum{_labels(method=method, route=route)} {totals['seconds']:.6f}")
+            lines.append(f"cariya_http_request_duration_seconds_count{_labels(method=method, route=route)} {count}")
+
+        for kind in ('reads', 'writes', 'queries'):
+            lines += [
+                f"# HELP cariya_http_datastore_{kind}_total Datastore document {kind} caused by requests, by route.",
+                f"# TYPE cariya_http_datastore_{kind}_total counter",
+            ]
+            for (method, route), totals in sorted(_routes.items()):
+                lines.append(f"cariya_http_datastore_{kind}_total{_labels(method=method, route=route)} {totals[kind]}")
+
+        for kind in ('reads', 'writes', 'queries'):
+            lines += [
+                f"# HELP cariya_datastore_{kind}_total Datastore document {kind} by store operation (requests and background jobs).",
+                f"# TYPE cariya_datastore_{kind}_total counter",
+            ]
+            for operation, totals in sorted(_operations.items()):
+                lines.append(f"cariya_datastore_{kind}_total{_labels(operation=operation)} {totals[kind]}")
+
+    for name, help_text, metric_type, value in extra:
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+        for labels, sample in value if isinstance(value, list) else [({}, value)]:
+            lines.append(f"{name}{_labels(**labels) if labels else ''} {sample}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,91 @@
+"""Mobile number -> user id index used by login, registration and bulk import.
+
+Run `python -m utils.mobile_index` from Backend/ once to index users registered before the
+index existed; after that, CARIYA_MOBILE_INDEX_FALLBACK=0 makes a login a single point read.
+"""
+import os
+from utils.cache import TTLCache
+from utils.storage import MOBILE_INDEX, WriteConflict, create_store
+from utils.segments import segment_state, record_segment_changes
+from utils.counters import counter_changes, record_counters
+
+# Fall back to querying users by mobile_number when the index has no entry (un-backfilled data)
+MOBILE_INDEX_FALLBACK = os.getenv("CARIYA_MOBILE_INDEX_FALLBACK", "1") == "1"
+
+_cache = TTLCache(
+    maxsize=int(os.getenv("CARIYA_MOBILE_CACHE_SIZE", "50000")),
+    ttl=float(os.getenv("CARIYA_MOBILE_CACHE_TTL", "600"))
+)
+
+
+def lookup_user_id(db, mobile_number):
+    """Return the user id registered for a normalized mobile number, or None."""
+    user_id = _cache.get(mobile_number)
+    if user_id is not None:
+        return user_id
+
+    entry = db.get_doc(MOBILE_INDEX, mobile_number)
+    if entry is not None:
+        user_id = entry['user_id']
+    elif MOBILE_INDEX_FALLBACK:
+        match = db.find_user_by_mobile(mobile_number)
+        if match is None:
+            return None
+        user_id = match[0]
+        db.set_doc(MOBILE_INDEX, mobile_number, {'user_id': user_id})  # Repair the index for next time
+    else:
+        return None
+
+    _cache.set(mobile_number, user_id)
+    return user_id
+
+
+def lookup_user_ids(db, mobile_numbers):
+    """Return {mobile_number: user_id} for the registered numbers, with one batched index read."""
+    mobile_numbers = set(mobile_numbers)
+    found = {mobile: entry['user_id'] for mobile, entry in db.get_docs(MOBILE_INDEX, mobile_numbers).items()}
+    missing = mobile_numbers - set(found)
+    if missing and MOBILE_INDEX_FALLBACK:
+        found.update(db.find_users_by_mobiles(missing))
+    return found
+
+
+def register_user(db, user_id, data):
+    """Create a user and its index entry atomically, with the mothers counter and segment change.
+
+    All four are written in one batch, as the importer does, so a conflict writes nothing.
+    Returns None on success, or 'mobile_number' / 'user_id' naming the key already taken.
+    """
+    mobile_number = data['mobile_number']
+    if MOBILE_INDEX_FALLBACK and lookup_user_id(db, mobile_number) is not None:
+        return 'mobile_number'
+    batch = db.batch()
+    batch.create_user_with_index(user_id, data, mobile_number)
+    record_segment_changes(batch, [(None, segment_state(data))])
+    record_counters(batch, counter_changes(mothers=1))
+    try:
+        batch.commit()
+    except WriteConflict:
+        return 'mobile_number' if db.get_doc(MOBILE_INDEX, mobile_number) is not None else 'user_id'
+    _cache.set(mobile_number, user_id)
+    return None
+
+
+def backfill_mobile_index(db, page_size=500):
+    """Write an index entry for every user, paging through the users collection; returns the count."""
+    indexed, cursor = 0, None
+    while True:
+        users = db.list_users(limit=page_size, start_after=cursor, fields=['mobile_number'])
+        if not users:
+            return indexed
+        batch = db.batch()
+        for user_id, user in users:
+            if user.get('mobile_number'):
+                batch.set_doc(MOBILE_INDEX, user['mobile_number'], {'user_id': user_id})
+                indexed += 1
+        batch.commit()
+        cursor = users[-1][0]
+
+
+if __name__ == "__main__":
+    print(f"Indexed {backfill_mobile_index(create_store())} mobile numbers")
@@ -0,0 +1,92 @@
+"""Programme periods: YYYY-MM month keys and the cycles that compliance is scored over.
+
+Cycles are CARIYA_CYCLE_MONTHS consecutive months, one after another from
+CARIYA_PROGRAMME_START. Compliance counts the months of the current cycle up to the
+current month. The current month stops at CARIYA_PROGRAMME_END when that is set
+(2025-04 reproduces the Jan-Apr 2025 pilot).
+"""
+import os
+import re
+from datetime import datetime
+
+PROGRAMME_START = os.getenv("CARIYA_PROGRAMME_START", "2025-01")
+PROGRAMME_END = os.getenv("CARIYA_PROGRAMME_END") or None
+CYCLE_MONTHS = int(os.getenv("CARIYA_CYCLE_MONTHS", "12"))
+POINTS_PER_MONTH = 2  # One for the savings milestone, one for an activity
+
+
+def month_key(year, month):
+    """Return the YYYY-MM key of a month."""
+    return f"{year:04d}-{month:02d}"
+
+
+def parse_month_key(key):
+    """Return (year, month) for a YYYY-MM key."""
+    match = re.fullmatch(r"(\d{4})-(0[1-9]|1[0-2])", str(key))
+    if not match:
+        raise ValueError(f"Month must look like YYYY-MM, got {key}")
+    return int(match.group(1)), int(match.group(2))
+
+
+def _index(key):
+    year, month = parse_month_key(key)
+    return year * 12 + month - 1
+
+
+def _from_index(index):
+    return month_key(index // 12, index % 12 + 1)
+
+
+def add_months(key, months):
+    """Return the key months after (or before, if negative) the given one."""
+    return _from_index(_index(key) + months)
+
+
+def month_range(start_key, end_key):
+    """Return the keys from start_key to end_key inclusive, across years."""
+    return [_from_index(index) for index in range(_index(start_key), _index(end_key) + 1)]
+
+
+def current_month_key(now=None):
+    """Return the key of the month entries are currently recorded against."""
+    now = now or datetime.now()
+    key = month_key(now.year, now.month)
+    return min(key, PROGRAMME_END) if PROGRAMME_END else key  # YYYY-MM keys sort chronologically
+
+
+def cycle_start(key):
+    """Return the first month of the programme cycle containing key."""
+    offset = (_index(key) - _index(PROGRAMME_START)) // CYCLE_MONTHS * CYCLE_MONTHS
+    return add_months(PROGRAMME_START, offset)
+
+
+def cycle_month_keys(as_of=None):
+    """Return the month keys that count towards compliance: the cycle containing as_of, up to as_of."""
+    as_of = as_of or current_month_key()
+    return month_range(cycle_start(as_of), as_of)
+
+
+def max_compliance_score(as_of=None):
+    """Return the highest compliance score reachable so far in the current cycle."""
+    return len(cycle_month_keys(as_of)) * POINTS_PER_MONTH
+
+
+def resolve_month_key(month=None, year=None, as_of=None):
+    """Return the key for a request's month (1-12) and optional year, rejecting future months and months before the programme.
+
+    The current month is used when month is not given, and the current month's year
+    when year is not.
+    """
+    as_of = as_of or current_month_key()
+    if month is None:
+        return as_of
+    if not 1 <= month <= 12:
+        raise ValueError("Month must be between 1 and 12")
+    if year is not None and not 1000 <= year <= 9999:
+        raise ValueError("Year must have four digits")
+    key = month_key(year if year is not None else parse_month_key(as_of)[0], month)
+    if key > as_of:
+        raise ValueError(f"Cannot record an entry for future month {key}")
+    if key < PROGRAMME_START:
+        raise ValueError(f"Month {key} is before the programme started ({PROGRAMME_START})")
+    return key
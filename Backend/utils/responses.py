@@ -0,0 +1,106 @@
+"""Fast JSON encoding and negotiated response compression for large payloads.
+
+JSON is encoded with orjson when it is installed (pip install orjson), and with compact
+stdlib json otherwise. Handlers that return big documents build a FastJSONResponse
+themselves, which skips FastAPI's jsonable_encoder pass. CompressionMiddleware
+compresses responses of CARIYA_COMPRESS_MIN_BYTES or more. It uses brotli when the
+client accepts it and the brotli package is installed, and gzip otherwise.
+"""
+import json
+import os
+import anyio.to_thread
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware, IdentityResponder, DEFAULT_EXCLUDED_CONTENT_TYPES
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.getenv("CARIYA_COMPRESS_MIN_BYTES", "1000"))
+GZIP_LEVEL = 6  # Most of level 9's ratio at a fraction of its CPU
+BROTLI_QUALITY = 5
+THREAD_MIN_BYTES = 128 * 1024  # Larger chunks are compressed off the event loop
+# Already-compressed bodies, besides Starlette's defaults (which include text/event-stream)
+EXCLUDED_CONTENT_TYPES = DEFAULT_EXCLUDED_CONTENT_TYPES + ("application/vnd.apache.parquet",)
+
+
+def dumps(content):
+    """Encode content as compact UTF-8 JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(content, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=str, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse encoded by dumps()."""
+
+    def render(self, content):
+        return dumps(content)
+
+
+def columnar_donor_view(page):
+    """Reshape a donor-view page into parallel columns, with month keys listed once.
+
+    user_savings and donor_contribution are per-user lists aligned with months, holding
+    null for months without savings.
+    """
+    rows = page['donor_view']
+    months = sorted({month_key for row in rows for month_key in row['monthly_data']})
+    columns = {
+        field: [row[field] for row in rows]
+        for field in ('user_id', 'first_name', 'surname', 'total_savings', 'total_user_savings', 'total_donor_contributions')
+    }
+    for field, source in (('user_savings', 'user_savings'), ('donor_contribution', 'donor_contribution')):
+        columns[field] = [
+            [row['monthly_data'][month_key][source] if month_key in row['monthly_data'] else None for month_key in months]
+            for row in rows
+        ]
+    return {**{key: value for key, value in page.items() if key != 'donor_view'}, "months": months, "donor_view": columns}
+
+
+def accepts_encoding(accept_encoding, encoding):
+    """Return whether an Accept-Encoding header allows the given coding (q=0 refuses it)."""
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.strip().partition(";")
+        if name.strip() == encoding:
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+class BrotliResponder(IdentityResponder):
+    content_encoding = "br"
+
+    def __init__(self, app, minimum_size, quality=BROTLI_QUALITY, *, exclude_content_types=EXCLUDED_CONTENT_TYPES):
+        super().__init__(app, minimum_size, exclude_content_types=exclude_content_types)
+        self.compressor = brotli.Compressor(quality=quality)
+
+    async def apply_compression(self, body, *, more_body):
+        if len(body) >= THREAD_MIN_BYTES:
+            return await anyio.to_thread.run_sync(self._compress_body, body, more_body)
+        return self._compress_body(body, more_body)
+
+    def _compress_body(self, body, more_body):
+        if more_body:
+            return self.compressor.process(body) + self.compressor.flush()
+        return self.compressor.process(body) + self.compressor.finish()
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """GZipMiddleware that prefers brotli when the client accepts it and the package is installed."""
+
+    def __init__(self, app, minimum_size=COMPRESS_MIN_BYTES):
+        super().__init__(app, minimum_size=minimum_size, compresslevel=GZIP_LEVEL, exclude_content_types=EXCLUDED_CONTENT_TYPES)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and brotli is not None and accepts_encoding(Headers(scope=scope).get("Accept-Encoding", ""), "br"):
+            responder = BrotliResponder(self.app, self.minimum_size, exclude_content_types=self.exclude_content_types)
+            await responder(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
@@ -0,0 +1,121 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from utils.storage import MONTHLY_SAVINGS, MONTHLY_ACTIVITIES, SUMMARY
+from utils.helpers import calculate_expected_savings
+from utils.periods import PROGRAMME_START, add_months, current_month_key, cycle_month_keys, resolve_month_key
+from utils.summary import ensure_summary, summary_scores
+from utils.user_cache import invalidate_users
+from utils.segments import segment_state, record_segment_changes
+from utils.logs import get_logger, sampled
+from utils.ledger import append_event
+from utils.live import user_delta, publish_deltas
+from utils.counters import counter_changes, record_counters
+
+SCORING_WORKERS = int(os.getenv("CARIYA_SCORING_WORKERS", "8"))
+USERS_PER_TASK = 250  # Users scored per worker task
+
+logger = get_logger("scoring")
+
+
+def _apply_scoring(tx, user_id, month_key, month_keys):
+    user = tx.get_user(user_id)
+    if user is None:
+        return None
+    month = tx.get_month(user_id, MONTHLY_SAVINGS, month_key)
+    has_activity = tx.get_month(user_id, MONTHLY_ACTIVITIES, month_key) is not None
+    summary = user[SUMMARY]
+    previous = summary.get(month_key)
+    entry = previous
+    milestone_score = 0
+    amount = 0.0
+
+    if month is not None:
+        # Milestone score for the target month, and the donor match of its savings when the
+        # user also has an activity; only the part not matched by an earlier run is credited
+        savings = month.get('savings', 0.0)
+        milestone_score = 1 if savings >= calculate_expected_savings(user['num_children']) else 0
+        donor_contribution = month.get('donor_contribution', 0.0)
+        if has_activity and savings > 0:
+            amount = savings - donor_contribution
+            donor_contribution = savings
+        month_data = {**month, 'milestone_score': milestone_score}
+        if donor_contribution:
+            month_data['donor_contribution'] = donor_contribution
+        if month_data != month:
+            tx.set_month(user_id, MONTHLY_SAVINGS, month_key, month_data)
+        entry = {
+            **(previous or {}), 'savings': savings, 'milestone_score': milestone_score,
+            'donor_contribution': donor_contribution, 'activity': 1 if has_activity else 0
+        }
+    elif has_activity:
+        entry = {**(previous or {}), 'activity': 1}
+
+    # Activity points and compliance over the months processed so far, from the fresh summary
+    fields = {}
+    if entry is not None and entry != previous:
+        fields[f"{SUMMARY}.{month_key}"] = entry
+        summary = {**summary, month_key: entry}
+    activity_points, compliance_score = summary_scores(summary, month_keys)
+    if (activity_points, compliance_score) != (user.get('activity_points'), user.get('compliance_score')):
+        fields.update({'activity_points': activity_points, 'compliance_score': compliance_score})
+    if amount:
+        append_event(tx, user_id, 'donor_match', month_key, amount)
+        fields['donor_contributions'] = user.get('donor_contributions', 0.0) + amount
+        fields['savings'] = user['savings'] + amount
+        record_counters(tx, counter_changes(month_key, donor_contributions=amount))
+    if fields:
+        tx.update_user(user_id, fields)
+        record_segment_changes(tx, [(segment_state(user), segment_state(user, fields))])
+    return {
+        "milestone_score": milestone_score,
+        "donor_contribution": amount,
+        "activity_points": activity_points,
+        "compliance_score": compliance_score,
+    }, user_delta(user_id, user, fields) if fields else None
+
+
+def score_user(db, user_id, user, month_key, month_keys):
+    """Score one user's month in a transaction and return the milestone, donor match and scores.
+
+    The user, the month's savings and its activity are re-read in the transaction, so a
+    deposit or activity committed after the user was listed is scored rather than
+    overwritten, and a month matched by an earlier or concurrent run is not credited again.
+    Only the fields that changed are written. Returns None for a user deleted since listing.
+    """
+    ensure_summary(db, user_id, user, current_month_key())
+    result = db.run_transaction(_apply_scoring, user_id, month_key, month_keys)
+    if result is None:
+        return None
+    result, delta = result
+    if delta is not None:
+        invalidate_users(user_id)
+        publish_deltas([delta])
+    return result
+
+
+def score_users(db, users, month_key, month_keys):
+    """Score a chunk of users, one transaction each; return how many were processed."""
+    for user_id, user in users:
+        result = score_user(db, user_id, user, month_key, month_keys)
+        if result is not None and sampled():
+            logger.debug("Scored user", extra={"user_id": user_id, "month_key": month_key, **result})
+    return len(users)
+
+
+def resolve_scoring_months(target_month=None, target_year=None):
+    """Return the target month key (the previous month by default) and the month keys that count towards compliance."""
+    as_of = current_month_key()
+    if target_month is None:
+        month_key = max(add_months(as_of, -1), PROGRAMME_START)
+    else:
+        month_key = resolve_month_key(target_month, target_year, as_of)
+    if month_key < PROGRAMME_START:
+        raise ValueError(f"Target month {month_key} is before the programme started ({PROGRAMME_START})")
+    return month_key, cycle_month_keys(as_of)
+
+
+def score_users_concurrently(db, users, month_key, month_keys, workers=None):
+    """Score users in chunks of USERS_PER_TASK on a pool of workers; return how many were processed."""
+    chunks = [users[i:i + USERS_PER_TASK] for i in range(0, len(users), USERS_PER_TASK)]
+    with ThreadPoolExecutor(max_workers=workers or SCORING_WORKERS, thread_name_prefix="cariya-scoring") as pool:
+        return sum(pool.map(lambda chunk: score_users(db, chunk, month_key, month_keys), chunks))
@@ -0,0 +1,195 @@
+import copy
+import os
+import random
+from collections import defaultdict
+from datetime import datetime
+from utils.storage import Increment, add_values, merge_fields
+from utils.executor import run_blocking
+from utils.periods import POINTS_PER_MONTH, cycle_month_keys
+
+ANALYTICS = 'analytics'
+SEGMENTS = 'segments'  # Shards segments-{n}: {buckets: {compliance_score: {count, savings, activity_points}}}
+SEGMENT_SHARDS = int(os.getenv("CARIYA_SEGMENT_SHARDS", "20"))  # Only ever raise it: shards beyond it are not read
+SEGMENT_FIELDS = ['compliance_score', 'savings', 'activity_points']
+
+
+def segment_shard_ids(shards=SEGMENT_SHARDS):
+    return [f"{SEGMENTS}-{shard}" for shard in range(shards)]
+
+
+def segment_state(user, update=None):
+    """Return a user's (compliance_score, savings, activity_points), optionally after applying an update."""
+    state = {field: user.get(field, 0) for field in SEGMENT_FIELDS}
+    if update:
+        merge_fields(state, {field: value for field, value in update.items() if field in SEGMENT_FIELDS})
+    return int(state['compliance_score']), float(state['savings']), int(state['activity_points'])
+
+
+def segment_delta(changes):
+    """Return the Increment updates that move users between compliance buckets.
+
+    changes is an iterable of (before, after) segment states; None stands for a user that
+    did not exist (before) or no longer counts (after).
+    """
+    totals = defaultdict(int)
+    for before, after in changes:
+        for state, sign in ((before, -1), (after, 1)):
+            if state is None:
+                continue
+            score, savings, activity_points = state
+            totals[f"buckets.{score}.count"] += sign
+            totals[f"buckets.{score}.savings"] += sign * savings
+            totals[f"buckets.{score}.activity_points"] += sign * activity_points
+    return {key: Increment(amount) for key, amount in totals.items() if amount}
+
+
+def record_segment_changes(target, changes):
+    """Add segment changes to one random shard of the aggregates through a store, write batch or transaction.
+
+    Every write path changes a user's bucket, so a single document would take a write from
+    each of them. Write paths pass the transaction or batch that changes the user, so the
+    aggregates move in the same commit.
+    """
+    fields = segment_delta(changes)
+    if fields:
+        target.merge_doc(ANALYTICS, random.choice(segment_shard_ids()), fields)
+
+
+def rebuild_segments(db, page_size=1000):
+    """Recompute the aggregates from every user with one grouped pass and store them.
+
+    Changes recorded while the users are scanned are carried over: the aggregates are
+    read before the scan and again in the transaction that writes the new baseline, and
+    whatever they gained in between is added to it. A rebuild that finished during the
+    scan is kept as it is. The baseline goes to the first shard and the others are cleared.
+    """
+    import pandas as pd  # Deferred so the API can boot without loading pandas
+
+    before = db.get_docs(ANALYTICS, segment_shard_ids())
+    frames, cursor = [], None
+    while True:
+        users = db.list_users(limit=page_size, start_after=cursor, fields=SEGMENT_FIELDS)
+        if not users:
+            break
+        frames.append(pd.DataFrame([user for _, user in users], columns=SEGMENT_FIELDS))
+        cursor = users[-1][0]
+
+    buckets = {}
+    if frames:
+        users = pd.concat(frames, ignore_index=True).fillna(0)
+        grouped = users.groupby(users['compliance_score'].astype(int)).agg(
+            count=('savings', 'size'), savings=('savings', 'sum'), activity_points=('activity_points', 'sum')
+        )
+        buckets = {
+            str(score): {'count': int(row['count']), 'savings': float(row['savings']), 'activity_points': int(row['activity_points'])}
+            for score, row in grouped.to_dict('index').items()
+        }
+    return db.run_transaction(_apply_rebuild, before, buckets)
+
+
+def _apply_rebuild(tx, before, buckets):
+    first, *rest = segment_shard_ids()
+    after = tx.get_docs(ANALYTICS, [first, *rest])
+    if after.get(first, {}).get('rebuilt_at') != before.get(first, {}).get('rebuilt_at'):
+        return _sum_shards(after)  # Another rebuild landed during the scan; its baseline is as fresh as this one
+    buckets = copy.deepcopy(buckets)
+    for shard in after.values():
+        add_values(buckets, shard.get('buckets', {}))
+    for shard in before.values():
+        add_values(buckets, shard.get('buckets', {}), sign=-1)
+    doc = {'buckets': buckets, 'rebuilt_at': datetime.now().isoformat()}
+    tx.set_doc(ANALYTICS, first, doc)
+    for shard_id in rest:
+        tx.set_doc(ANALYTICS, shard_id, {})
+    return doc
+
+
+def _sum_shards(shards):
+    buckets = {}
+    for shard in shards.values():
+        add_values(buckets, shard.get('buckets', {}))
+    first = shards.get(segment_shard_ids()[0], {})
+    return {'buckets': buckets, 'rebuilt_at': first.get('rebuilt_at')}
+
+
+def load_segments(db):
+    """Return the running aggregates summed over every shard, rebuilding them first if they were never built."""
+    doc = _sum_shards(db.get_docs(ANALYTICS, segment_shard_ids()))
+    if doc['rebuilt_at'] is None:  # Only increments so far, with no baseline to add them to
+        doc = rebuild_segments(db)
+    return doc
+
+
+def _segment_name(score, max_possible_score):
+    if max_possible_score >= 18 and score >= 18:
+        return 'high_compliance'  # 18-24 points
+    if max_possible_score >= 10 and score >= 10:
+        return 'moderate_compliance'  # 10-17 points
+    return 'low_compliance'  # 0-9 points
+
+
+def segment_users_and_analyze_trends(db):
+    """Segment users based on compliance scores and analyze behavior trends, from the running aggregates."""
+    try:
+        months = len(cycle_month_keys())  # Months of the current cycle so far
+        max_possible_score = months * POINTS_PER_MONTH
+
+        doc = load_segments(db)
+        segments = {
+            name: {'count': 0, 'total_savings': 0.0, 'total_compliance_score': 0, 'total_activity_points': 0}
+            for name in ('high_compliance', 'moderate_compliance', 'low_compliance')
+        }
+        for score, bucket in doc['buckets'].items():
+            segment = segments[_segment_name(int(score), max_possible_score)]
+            segment['count'] += bucket.get('count', 0)
+            segment['total_savings'] += bucket.get('savings', 0.0)
+            segment['total_compliance_score'] += int(score) * bucket.get('count', 0)
+            segment['total_activity_points'] += bucket.get('activity_points', 0)
+
+        total_users = sum(segment['count'] for segment in segments.values())
+        if not total_users:
+            return {"message": "No users found to segment"}
+        total_savings = sum(segment['total_savings'] for segment in segments.values())
+        total_activities = sum(segment['total_activity_points'] for segment in segments.values())
+        total_compliance_score = sum(segment['total_compliance_score'] for segment in segments.values())
+
+        for segment in segments.values():
+            count = segment['count']
+            segment['percentage'] = count / total_users * 100
+            segment['average_savings'] = segment['total_savings'] / count if count else 0
+            segment['average_compliance_score'] = segment['total_compliance_score'] / count if count else 0
+            segment['average_activity_points'] = segment['total_activity_points'] / count if count else 0
+
+        # Calculate trends and insights
+        avg_compliance_score = total_compliance_score / total_users
+        avg_savings_per_user = total_savings / total_users
+        activity_participation_rate = (total_activities / (total_users * months)) * 100
+        low_percentage = segments['low_compliance']['percentage']
+
+        insights = []
+        if low_percentage > 50:
+            insights.append(f"{low_percentage:.1f}% of users need intervention to increase engagement. Consider targeted outreach.")
+        if activity_participation_rate < 50:
+            insights.append(f"Only {activity_participation_rate:.1f}% of possible activities are being completed. Encourage more activity participation.")
+        if avg_savings_per_user < 1000 * months:
+            insights.append(f"Average savings ({avg_savings_per_user:.1f} UGX) is below expected ({1000 * months} UGX per user). Promote savings initiatives.")
+
+        return {
+            "segmentation": segments,
+            "trends": {
+                "total_users": total_users,
+                "average_compliance_score": avg_compliance_score,
+                "average_savings_per_user": avg_savings_per_user,
+                "activity_participation_rate": activity_participation_rate
+            },
+            "insights": insights,
+            "rebuilt_at": doc['rebuilt_at']
+        }
+
+    except Exception as e:
+        raise ValueError(f"Error segmenting users: {str(e)}")
+
+
+async def segment_users_and_analyze_trends_async(db):
+    """Async counterpart of segment_users_and_analyze_trends, run off the event loop."""
+    return await run_blocking(segment_users_and_analyze_trends, db)
@@ -0,0 +1,67 @@
+"""Request coalescing (single-flight) for expensive reads.
+
+Concurrent calls with the same key share one in-flight computation instead of each
+scanning the datastore. A finished result is also handed to calls that arrive within
+CARIYA_COALESCE_WINDOW_SECONDS, capping how often a hot read runs during a traffic
+spike (0 shares only in-flight calls). Results are shared, not copied, so callers must
+not modify them. Failures are never reused: the next call runs the computation again.
+"""
+import asyncio
+import os
+from collections import defaultdict
+
+COALESCE_WINDOW_SECONDS = float(os.getenv("CARIYA_COALESCE_WINDOW_SECONDS", "1"))
+
+
+class SingleFlight:
+    """Share one computation per key among concurrent and closely following callers, with counters per name."""
+
+    def __init__(self, window):
+        self.window = window
+        self._calls = {}  # key: (task, expires at on the loop's clock, or None while running)
+        self.counts = defaultdict(lambda: {'computed': 0, 'in_flight': 0, 'window': 0})
+
+    async def run(self, key, func, *args):
+        """Return await func(*args), sharing it with every caller of the same key; key[0] names it in the counters.
+
+        The computation runs as its own task, so a caller that disconnects does not
+        cancel it for the callers still waiting.
+        """
+        loop = asyncio.get_running_loop()
+        counts = self.counts[key[0]]
+        call = self._calls.get(key)
+        if call is not None:
+            task, expires = call
+            if expires is None:
+                counts['in_flight'] += 1
+                return await asyncio.shield(task)
+            if loop.time() < expires:
+                counts['window'] += 1
+                return task.result()
+
+        counts['computed'] += 1
+        task = asyncio.ensure_future(func(*args))
+        self._calls[key] = (task, None)
+        task.add_done_callback(lambda done: self._finished(key, done))
+        return await asyncio.shield(task)
+
+    def _finished(self, key, task):
+        if self._calls.get(key, (None,))[0] is not task:
+            return
+        if task.cancelled() or task.exception() is not None or not self.window:
+            del self._calls[key]
+        else:
+            self._calls[key] = (task, asyncio.get_running_loop().time() + self.window)
+        self._prune()
+
+    def _prune(self):
+        """Drop expired results, so keys such as donor-view cursors do not accumulate."""
+        now = asyncio.get_running_loop().time()
+        for key in [key for key, (_, expires) in self._calls.items() if expires is not None and expires <= now]:
+            del self._calls[key]
+
+    def stats(self):
+        return {name: dict(counts) for name, counts in self.counts.items()}
+
+
+single_flight = SingleFlight(COALESCE_WINDOW_SECONDS)
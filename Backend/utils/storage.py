@@ -0,0 +1,694 @@
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+MONTHLY_SAVINGS = 'monthly_savings'
+MONTHLY_ACTIVITIES = 'monthly_activities'
+MOBILE_INDEX = 'mobile_index'  # {normalized mobile number: {user_id}}, kept in sync on registration
+SUMMARY = 'monthly_summary'  # {month_key: {savings, milestone_score, donor_contribution, activity}} on the user document
+BATCH_LIMIT = 500  # Firestore's maximum number of writes per batch commit
+IN_QUERY_LIMIT = 30  # Firestore's maximum number of values in an 'in' filter
+TRANSACTION_ATTEMPTS = int(os.getenv("CARIYA_TRANSACTION_ATTEMPTS", "8"))
+TRANSACTION_BACKOFF = 0.02  # Seconds before the first retry of a contended transaction; doubles per attempt
+
+
+class WriteConflict(Exception):
+    """A batch could not create a document because it already exists; none of the batch's writes were applied."""
+
+
+class Increment:
+    """Update value that atomically adds to a numeric field instead of overwriting it."""
+
+    def __init__(self, amount):
+        self.amount = amount
+
+
+def merge_fields(doc, fields):
+    """Apply an update to a dict the way Firestore does, with dotted keys addressing nested maps."""
+    for key, value in fields.items():
+        *parents, leaf = key.split('.')
+        target = doc
+        for part in parents:
+            target = target.setdefault(part, {})
+        target[leaf] = target.get(leaf, 0) + value.amount if isinstance(value, Increment) else value
+    return doc
+
+
+def add_values(total, doc, sign=1):
+    """Add the numbers of a nested document into total in place (sign=-1 subtracts them); other values are skipped."""
+    for key, value in doc.items():
+        if isinstance(value, dict):
+            add_values(total.setdefault(key, {}), value, sign)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            total[key] = total.get(key, 0) + sign * value
+    return total
+
+
+def _firestore_paths(fields):
+    """Quote dotted update keys segment by segment (month keys such as 2025-01 are not simple names)."""
+    from google.cloud.firestore_v1 import Increment as FirestoreIncrement
+    from google.cloud.firestore_v1.field_path import FieldPath
+
+    return {
+        FieldPath(*key.split('.')).to_api_repr(): FirestoreIncrement(value.amount) if isinstance(value, Increment) else value
+        for key, value in fields.items()
+    }
+
+
+def _firestore_nested(fields):
+    """Expand dotted update keys into nested maps, for a set(..., merge=True) that may create the document."""
+    from google.cloud.firestore_v1 import Increment as FirestoreIncrement
+
+    nested = {}
+    for key, value in fields.items():
+        *parents, leaf = key.split('.')
+        target = nested
+        for part in parents:
+            target = target.setdefault(part, {})
+        target[leaf] = FirestoreIncrement(value.amount) if isinstance(value, Increment) else value
+    return nested
+
+
+def backoff_delay(attempt):
+    """Exponential backoff with full jitter for the given retry attempt."""
+    return random.uniform(0, TRANSACTION_BACKOFF * 2 ** attempt)
+
+
+class Store:
+    """Repository interface over users and their month-keyed subcollections."""
+
+    def get_user(self, user_id):
+        """Return the user document as a dict, or None if it does not exist."""
+        raise NotImplementedError
+
+    def create_user(self, user_id, data):
+        """Create (or overwrite) a user document."""
+        raise NotImplementedError
+
+    def update_user(self, user_id, fields):
+        """Merge fields into an existing user document; dotted keys address nested map fields."""
+        raise NotImplementedError
+
+    def create_user_with_index(self, user_id, data, mobile_number):
+        """Atomically create a user and its mobile_index entry if neither exists.
+
+        Returns None on success, or 'mobile_number' / 'user_id' naming the key already taken.
+        """
+        raise NotImplementedError
+
+    def find_user_by_mobile(self, mobile_number):
+        """Return (user_id, user) for a normalized mobile number, or None."""
+        raise NotImplementedError
+
+    def get_users(self, user_ids):
+        """Return {user_id: user} for the given ids that exist, in a single round trip."""
+        raise NotImplementedError
+
+    def find_users_by_mobiles(self, mobile_numbers):
+        """Return {mobile_number: user_id} for the given normalized numbers that are registered."""
+        raise NotImplementedError
+
+    def list_users(self, limit=None, start_after=None, fields=None):
+        """Return users ordered by id as (user_id, user) tuples, optionally one page and a field projection."""
+        raise NotImplementedError
+
+    def count_users(self):
+        """Return the number of user documents."""
+        raise NotImplementedError
+
+    def get_month(self, user_id, collection, month_key):
+        """Return a single month document, or None if it does not exist."""
+        raise NotImplementedError
+
+    def get_months(self, user_id, collection):
+        """Return all month documents of a subcollection as {month_key: data}."""
+        raise NotImplementedError
+
+    def get_month_range(self, user_id, collection, start_key, end_key):
+        """Return the month documents from start_key to end_key inclusive as {month_key: data}, with one query.
+
+        A start_key of None starts from the subcollection's first document.
+        """
+        raise NotImplementedError
+
+    def get_months_for_users(self, user_ids, collection, month_keys):
+        """Return {user_id: {month_key: data}} for many users in a single round trip."""
+        raise NotImplementedError
+
+    def set_month(self, user_id, collection, month_key, data):
+        """Create (or overwrite) a month document."""
+        raise NotImplementedError
+
+    def update_month(self, user_id, collection, month_key, fields):
+        """Merge fields into an existing month document."""
+        raise NotImplementedError
+
+    def get_doc(self, collection, doc_id):
+        """Return a document from a top-level collection (e.g. jobs), or None."""
+        raise NotImplementedError
+
+    def get_docs(self, collection, doc_ids):
+        """Return {doc_id: data} for the given ids that exist in a top-level collection, in one round trip."""
+        raise NotImplementedError
+
+    def set_doc(self, collection, doc_id, data):
+        """Create (or overwrite) a document in a top-level collection."""
+        raise NotImplementedError
+
+    def update_doc(self, collection, doc_id, fields):
+        """Merge fields into an existing document in a top-level collection."""
+        raise NotImplementedError
+
+    def merge_doc(self, collection, doc_id, fields):
+        """Merge fields into a document in a top-level collection, creating it if it does not exist."""
+        raise NotImplementedError
+
+    def batch(self):
+        """Return a write batch exposing the store's write methods and commit.
+
+        A batch's create_user_with_index creates both documents only if neither exists;
+        when one does, commit raises WriteConflict and writes nothing.
+        """
+        raise NotImplementedError
+
+    def run_transaction(self, func, *args):
+        """Run func(tx, *args) atomically, retrying with backoff when it contends with another writer.
+
+        tx exposes get_user, get_month, get_doc and get_docs (all reads must come before
+        writes), plus set_month, update_user, set_doc and merge_doc. func may run more than
+        once, so it must not have side effects outside tx.
+        """
+        raise NotImplementedError
+
+
+class _FirestoreTransaction:
+    """Read/write view of the store bound to one Firestore transaction."""
+
+    def __init__(self, store, transaction):
+        self.store = store
+        self.transaction = transaction
+
+    def get_user(self, user_id):
+        doc = self.store._user_ref(user_id).get(transaction=self.transaction)
+        return doc.to_dict() if doc.exists else None
+
+    def get_month(self, user_id, collection, month_key):
+        doc = self.store._user_ref(user_id).collection(collection).document(month_key).get(transaction=self.transaction)
+        return doc.to_dict() if doc.exists else None
+
+    def get_doc(self, collection, doc_id):
+        doc = self.store.client.collection(collection).document(doc_id).get(transaction=self.transaction)
+        return doc.to_dict() if doc.exists else None
+
+    def get_docs(self, collection, doc_ids):
+        refs = [self.store.client.collection(collection).document(doc_id) for doc_id in doc_ids]
+        return {doc.id: doc.to_dict() for doc in self.store.client.get_all(refs, transaction=self.transaction) if doc.exists}
+
+    def set_month(self, user_id, collection, month_key, data):
+        self.transaction.set(self.store._user_ref(user_id).collection(collection).document(month_key), data)
+
+    def update_user(self, user_id, fields):
+        self.transaction.update(self.store._user_ref(user_id), _firestore_paths(fields))
+
+    def set_doc(self, collection, doc_id, data):
+        self.transaction.set(self.store.client.collection(collection).document(doc_id), data)
+
+    def merge_doc(self, collection, doc_id, fields):
+        self.transaction.set(self.store.client.collection(collection).document(doc_id), _firestore_nested(fields), merge=True)
+
+
+class _FirestoreBatch:
+    """WriteBatch wrapper that commits before an operation would take a commit past BATCH_LIMIT writes."""
+
+    def __init__(self, store):
+        self.store = store
+        self.batch = store.client.batch()
+        self.pending = 0
+
+    def _reserve(self, count=1):
+        """Make room for count writes in the current commit, committing the pending ones first if they would not fit."""
+        if self.pending + count > BATCH_LIMIT:
+            self.commit()
+        self.pending += count
+
+    def create_user(self, user_id, data):
+        self._reserve()
+        self.batch.set(self.store._user_ref(user_id), data)
+
+    def create_user_with_index(self, user_id, data, mobile_number):
+        self._reserve(2)  # The user and its index entry go in the same commit
+        self.batch.create(self.store.client.collection(MOBILE_INDEX).document(mobile_number), {'user_id': user_id})
+        self.batch.create(self.store._user_ref(user_id), data)
+
+    def update_user(self, user_id, fields):
+        self._reserve()
+        self.batch.update(self.store._user_ref(user_id), _firestore_paths(fields))
+
+    def set_month(self, user_id, collection, month_key, data):
+        self._reserve()
+        self.batch.set(self.store._user_ref(user_id).collection(collection).document(month_key), data)
+
+    def update_month(self, user_id, collection, month_key, fields):
+        self._reserve()
+        self.batch.update(self.store._user_ref(user_id).collection(collection).document(month_key), _firestore_paths(fields))
+
+    def set_doc(self, collection, doc_id, data):
+        self._reserve()
+        self.batch.set(self.store.client.collection(collection).document(doc_id), data)
+
+    def update_doc(self, collection, doc_id, fields):
+        self._reserve()
+        self.batch.update(self.store.client.collection(collection).document(doc_id), _firestore_paths(fields))
+
+    def merge_doc(self, collection, doc_id, fields):
+        self._reserve()
+        self.batch.set(self.store.client.collection(collection).document(doc_id), _firestore_nested(fields), merge=True)
+
+    def commit(self):
+        from google.api_core.exceptions import AlreadyExists, Conflict
+
+        batch, pending = self.batch, self.pending
+        self.batch = self.store.client.batch()
+        self.pending = 0
+        if pending:
+            try:
+                batch.commit()
+            except (AlreadyExists, Conflict) as e:
+                raise WriteConflict(str(e)) from e
+
+
+class _SQLiteBatch:
+    """Buffers writes and applies them in a single SQLite transaction on commit."""
+
+    def __init__(self, store):
+        self.store = store
+        self.ops = []
+
+    def create_user(self, user_id, data):
+        self.ops.append((self.store.create_user, (user_id, data)))
+
+    def create_user_with_index(self, user_id, data, mobile_number):
+        self.ops.append((self._create_user_with_index, (user_id, data, mobile_number)))
+
+    def _create_user_with_index(self, user_id, data, mobile_number):
+        conflict = self.store.create_user_with_index(user_id, data, mobile_number)
+        if conflict is not None:
+            raise WriteConflict(f"{conflict} already exists for user {user_id}")
+
+    def update_user(self, user_id, fields):
+        self.ops.append((self.store.update_user, (user_id, fields)))
+
+    def set_month(self, user_id, collection, month_key, data):
+        self.ops.append((self.store.set_month, (user_id, collection, month_key, data)))
+
+    def update_month(self, user_id, collection, month_key, fields):
+        self.ops.append((self.store.update_month, (user_id, collection, month_key, fields)))
+
+    def set_doc(self, collection, doc_id, data):
+        self.ops.append((self.store.set_doc, (collection, doc_id, data)))
+
+    def update_doc(self, collection, doc_id, fields):
+        self.ops.append((self.store.update_doc, (collection, doc_id, fields)))
+
+    def merge_doc(self, collection, doc_id, fields):
+        self.ops.append((self.store.merge_doc, (collection, doc_id, fields)))
+
+    def commit(self):
+        with self.store.transaction():
+            for op, args in self.ops:
+                op(*args)
+        self.ops = []
+
+
+class FirestoreStore(Store):
+    """Store backed by a Firebase project's Firestore database."""
+
+    def __init__(self, credentials_path="creds.json"):
+        import firebase_admin
+        from firebase_admin import credentials, firestore
+
+        try:
+            firebase_admin.get_app()
+        except ValueError:
+            firebase_admin.initialize_app(credentials.Certificate(credentials_path))
+        self.client = firestore.client()
+        self._transactional = firestore.transactional
+
+    def _user_ref(self, user_id):
+        return self.client.collection('users').document(user_id)
+
+    def get_user(self, user_id):
+        doc = self._user_ref(user_id).get()
+        return doc.to_dict() if doc.exists else None
+
+    def create_user(self, user_id, data):
+        self._user_ref(user_id).set(data)
+
+    def update_user(self, user_id, fields):
+        self._user_ref(user_id).update(_firestore_paths(fields))
+
+    def create_user_with_index(self, user_id, data, mobile_number):
+        from google.api_core.exceptions import AlreadyExists, Conflict
+
+        batch = self.client.batch()
+        batch.create(self.client.collection(MOBILE_INDEX).document(mobile_number), {'user_id': user_id})
+        batch.create(self._user_ref(user_id), data)
+        try:
+            batch.commit()
+        except (AlreadyExists, Conflict):
+            return 'mobile_number' if self.get_doc(MOBILE_INDEX, mobile_number) is not None else 'user_id'
+        return None
+
+    def find_user_by_mobile(self, mobile_number):
+        docs = self.client.collection('users').where('mobile_number', '==', mobile_number).limit(1).get()
+        if not docs:
+            return None
+        return docs[0].id, docs[0].to_dict()
+
+    def get_users(self, user_ids):
+        docs = self.client.get_all([self._user_ref(user_id) for user_id in user_ids])
+        return {doc.id: doc.to_dict() for doc in docs if doc.exists}
+
+    def find_users_by_mobiles(self, mobile_numbers):
+        mobile_numbers = list(mobile_numbers)
+        found = {}
+        for i in range(0, len(mobile_numbers), IN_QUERY_LIMIT):
+            query = self.client.collection('users').where('mobile_number', 'in', mobile_numbers[i:i + IN_QUERY_LIMIT])
+            for doc in query.select(['mobile_number']).get():
+                found[doc.get('mobile_number')] = doc.id
+        return found
+
+    def list_users(self, limit=None, start_after=None, fields=None):
+        query = self.client.collection('users').order_by('__name__')
+        if fields is not None:
+            query = query.select(fields)
+        if start_after is not None:
+            query = query.start_after({'__name__': start_after})
+        if limit is not None:
+            query = query.limit(limit)
+        return [(doc.id, doc.to_dict()) for doc in query.get()]
+
+    def count_users(self):
+        return self.client.collection('users').count().get()[0][0].value
+
+    def get_month(self, user_id, collection, month_key):
+        doc = self._user_ref(user_id).collection(collection).document(month_key).get()
+        return doc.to_dict() if doc.exists else None
+
+    def get_months(self, user_id, collection):
+        return {doc.id: doc.to_dict() for doc in self._user_ref(user_id).collection(collection).get()}
+
+    def get_month_range(self, user_id, collection, start_key, end_key):
+        query = self._user_ref(user_id).collection(collection).order_by('__name__')
+        if start_key is not None:
+            query = query.start_at({'__name__': start_key})
+        query = query.end_at({'__name__': end_key})
+        return {doc.id: doc.to_dict() for doc in query.get()}
+
+    def get_months_for_users(self, user_ids, collection, month_keys):
+        refs = [
+            self._user_ref(user_id).collection(collection).document(month_key)
+            for user_id in user_ids for month_key in month_keys
+        ]
+        months = {user_id: {} for user_id in user_ids}
+        for doc in self.client.get_all(refs):
+            if doc.exists:
+                months[doc.reference.parent.parent.id][doc.id] = doc.to_dict()
+        return months
+
+    def set_month(self, user_id, collection, month_key, data):
+        self._user_ref(user_id).collection(collection).document(month_key).set(data)
+
+    def update_month(self, user_id, collection, month_key, fields):
+        self._user_ref(user_id).collection(collection).document(month_key).update(_firestore_paths(fields))
+
+    def get_doc(self, collection, doc_id):
+        doc = self.client.collection(collection).document(doc_id).get()
+        return doc.to_dict() if doc.exists else None
+
+    def get_docs(self, collection, doc_ids):
+        docs = self.client.get_all([self.client.collection(collection).document(doc_id) for doc_id in doc_ids])
+        return {doc.id: doc.to_dict() for doc in docs if doc.exists}
+
+    def set_doc(self, collection, doc_id, data):
+        self.client.collection(collection).document(doc_id).set(data)
+
+    def update_doc(self, collection, doc_id, fields):
+        self.client.collection(collection).document(doc_id).update(_firestore_paths(fields))
+
+    def merge_doc(self, collection, doc_id, fields):
+        self.client.collection(collection).document(doc_id).set(_firestore_nested(fields), merge=True)
+
+    def batch(self):
+        return _FirestoreBatch(self)
+
+    def run_transaction(self, func, *args):
+        # One commit attempt per Firestore transaction so retries get our backoff between them;
+        # the client reports an aborted (contended) commit as this ValueError.
+        for attempt in range(TRANSACTION_ATTEMPTS):
+            transaction = self.client.transaction(max_attempts=1)
+            try:
+                return self._transactional(lambda t: func(_FirestoreTransaction(self, t), *args))(transaction)
+            except ValueError as e:
+                if not str(e).startswith("Failed to commit transaction") or attempt == TRANSACTION_ATTEMPTS - 1:
+                    raise
+            time.sleep(backoff_delay(attempt))
+
+
+class SQLiteStore(Store):
+    """Local stand-in storing the same documents as JSON in SQLite (in-memory by default)."""
+
+    def __init__(self, path=":memory:"):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.RLock()
+        self._depth = 0
+        with self.transaction():
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS users ("
+                "id TEXT PRIMARY KEY, mobile_number TEXT, data TEXT NOT NULL)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS users_mobile ON users (mobile_number)")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS months ("
+                "user_id TEXT NOT NULL, collection TEXT NOT NULL, month_key TEXT NOT NULL, data TEXT NOT NULL, "
+                "PRIMARY KEY (user_id, collection, month_key))"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS docs ("
+                "collection TEXT NOT NULL, id TEXT NOT NULL, data TEXT NOT NULL, PRIMARY KEY (collection, id))"
+            )
+
+    @contextmanager
+    def transaction(self):
+        """Hold the store lock and commit (or roll back) when the outermost block exits."""
+        with self.lock:
+            self._depth += 1
+            try:
+                if self._depth == 1:
+                    self.conn.execute("BEGIN IMMEDIATE")  # Take the write lock up front, as other processes may share the file
+                yield self.conn
+            except BaseException:
+                if self._depth == 1:
+                    self.conn.rollback()
+                raise
+            else:
+                if self._depth == 1:
+                    self.conn.commit()
+            finally:
+                self._depth -= 1
+
+    def get_user(self, user_id):
+        with self.lock:
+            row = self.conn.execute("SELECT data FROM users WHERE id = ?", (user_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def create_user(self, user_id, data):
+        with self.transaction():
+            self.conn.execute(
+                "INSERT OR REPLACE INTO users (id, mobile_number, data) VALUES (?, ?, ?)",
+                (user_id, data.get('mobile_number'), json.dumps(data)),
+            )
+
+    def update_user(self, user_id, fields):
+        with self.transaction():
+            user = self.get_user(user_id)
+            if user is None:
+                raise ValueError(f"No user found with unique identifier {user_id}")
+            merge_fields(user, fields)
+            self.conn.execute(
+                "UPDATE users SET mobile_number = ?, data = ? WHERE id = ?",
+                (user.get('mobile_number'), json.dumps(user), user_id),
+            )
+
+    def create_user_with_index(self, user_id, data, mobile_number):
+        with self.transaction():
+            if self.get_doc(MOBILE_INDEX, mobile_number) is not None:
+                return 'mobile_number'
+            if self.get_user(user_id) is not None:
+                return 'user_id'
+            self.set_doc(MOBILE_INDEX, mobile_number, {'user_id': user_id})
+            self.create_user(user_id, data)
+        return None
+
+    def find_user_by_mobile(self, mobile_number):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT id, data FROM users WHERE mobile_number = ? LIMIT 1", (mobile_number,)
+            ).fetchone()
+        return (row[0], json.loads(row[1])) if row else None
+
+    def get_users(self, user_ids):
+        user_ids = list(user_ids)
+        if not user_ids:
+            return {}
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT id, data FROM users WHERE id IN ({', '.join('?' * len(user_ids))})", user_ids
+            ).fetchall()
+        return {user_id: json.loads(data) for user_id, data in rows}
+
+    def find_users_by_mobiles(self, mobile_numbers):
+        mobile_numbers = list(mobile_numbers)
+        if not mobile_numbers:
+            return {}
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT mobile_number, id FROM users WHERE mobile_number IN ({', '.join('?' * len(mobile_numbers))})",
+                mobile_numbers,
+            ).fetchall()
+        return dict(rows)
+
+    def list_users(self, limit=None, start_after=None, fields=None):
+        sql, params = "SELECT id, data FROM users", []
+        if start_after is not None:
+            sql += " WHERE id > ?"
+            params.append(start_after)
+        sql += " ORDER BY id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self.lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        users = [(user_id, json.loads(data)) for user_id, data in rows]
+        if fields is not None:
+            users = [(user_id, {f: user[f] for f in fields if f in user}) for user_id, user in users]
+        return users
+
+    def count_users(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    def get_month(self, user_id, collection, month_key):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT data FROM months WHERE user_id = ? AND collection = ? AND month_key = ?",
+                (user_id, collection, month_key),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_months(self, user_id, collection):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT month_key, data FROM months WHERE user_id = ? AND collection = ? ORDER BY month_key",
+                (user_id, collection),
+            ).fetchall()
+        return {month_key: json.loads(data) for month_key, data in rows}
+
+    def get_month_range(self, user_id, collection, start_key, end_key):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT month_key, data FROM months WHERE user_id = ? AND collection = ? "
+                "AND month_key >= coalesce(?, month_key) AND month_key <= ? ORDER BY month_key",
+                (user_id, collection, start_key, end_key),
+            ).fetchall()
+        return {month_key: json.loads(data) for month_key, data in rows}
+
+    def get_months_for_users(self, user_ids, collection, month_keys):
+        months = {user_id: {} for user_id in user_ids}
+        if not user_ids or not month_keys:
+            return months
+        user_marks = ", ".join("?" * len(user_ids))
+        month_marks = ", ".join("?" * len(month_keys))
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT user_id, month_key, data FROM months WHERE collection = ? "
+                f"AND user_id IN ({user_marks}) AND month_key IN ({month_marks}) ORDER BY user_id, month_key",
+                [collection, *user_ids, *month_keys],
+            ).fetchall()
+        for user_id, month_key, data in rows:
+            months[user_id][month_key] = json.loads(data)
+        return months
+
+    def set_month(self, user_id, collection, month_key, data):
+        with self.transaction():
+            self.conn.execute(
+                "INSERT OR REPLACE INTO months (user_id, collection, month_key, data) VALUES (?, ?, ?, ?)",
+                (user_id, collection, month_key, json.dumps(data)),
+            )
+
+    def update_month(self, user_id, collection, month_key, fields):
+        with self.transaction():
+            month = self.get_month(user_id, collection, month_key)
+            if month is None:
+                raise ValueError(f"No {collection} document {month_key} for user {user_id}")
+            merge_fields(month, fields)
+            self.set_month(user_id, collection, month_key, month)
+
+    def get_doc(self, collection, doc_id):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT data FROM docs WHERE collection = ? AND id = ?", (collection, doc_id)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_docs(self, collection, doc_ids):
+        doc_ids = list(doc_ids)
+        if not doc_ids:
+            return {}
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT id, data FROM docs WHERE collection = ? AND id IN ({', '.join('?' * len(doc_ids))})",
+                [collection, *doc_ids],
+            ).fetchall()
+        return {doc_id: json.loads(data) for doc_id, data in rows}
+
+    def set_doc(self, collection, doc_id, data):
+        with self.transaction():
+            self.conn.execute(
+                "INSERT OR REPLACE INTO docs (collection, id, data) VALUES (?, ?, ?)",
+                (collection, doc_id, json.dumps(data)),
+            )
+
+    def update_doc(self, collection, doc_id, fields):
+        with self.transaction():
+            doc = self.get_doc(collection, doc_id)
+            if doc is None:
+                raise ValueError(f"No {collection} document {doc_id}")
+            merge_fields(doc, fields)
+            self.set_doc(collection, doc_id, doc)
+
+    def merge_doc(self, collection, doc_id, fields):
+        with self.transaction():
+            self.set_doc(collection, doc_id, merge_fields(self.get_doc(collection, doc_id) or {}, fields))
+
+    def batch(self):
+        return _SQLiteBatch(self)
+
+    def run_transaction(self, func, *args):
+        # BEGIN IMMEDIATE serializes writers, so there is no contention to retry here
+        with self.transaction():
+            return func(self, *args)
+
+
+def create_store(backend=None):
+    """Create the configured store ('firestore' or 'sqlite', from CARIYA_STORE by default)."""
+    backend = backend or os.getenv("CARIYA_STORE", "firestore")
+    if backend == "firestore":
+        return FirestoreStore(os.getenv("CARIYA_FIREBASE_CREDENTIALS", "creds.json"))
+    if backend == "sqlite":
+        return SQLiteStore(os.getenv("CARIYA_SQLITE_PATH", ":memory:"))
+    raise ValueError(f"Unknown storage backend: {backend}")
@@ -0,0 +1,257 @@
+from utils.storage import MONTHLY_SAVINGS, MONTHLY_ACTIVITIES, SUMMARY
+from utils.periods import cycle_month_keys
+from utils.helpers import calculate_expected_savings
+from utils.user_cache import invalidate_users
+from utils.segments import segment_state, record_segment_changes
+from utils.ledger import append_event, ledger_balance
+from utils.live import user_delta, publish_deltas
+from utils.counters import active_in_month, counter_changes, add_changes, record_counters
+
+
+def build_summary(savings, activities):
+    """Build the per-month summary from a user's monthly_savings and monthly_activities documents."""
+    summary = {}
+    for month_key, s_data in savings.items():
+        summary[month_key] = {
+            'savings': s_data.get('savings', 0.0),
+            'milestone_score': s_data.get('milestone_score', 0),
+            'donor_contribution': s_data.get('donor_contribution', 0.0),
+            'activity': 0
+        }
+    for month_key in activities:
+        summary.setdefault(month_key, {'activity': 0})['activity'] = 1
+    return summary
+
+
+def summary_scores(summary, month_keys):
+    """Return (activity_points, compliance_score) over the given months of a summary."""
+    activity_points = sum(summary.get(key, {}).get('activity', 0) for key in month_keys)
+    milestones = sum(summary.get(key, {}).get('milestone_score', 0) for key in month_keys)
+    return activity_points, activity_points + milestones
+
+
+def monthly_savings_view(summary):
+    """Return {month_key: savings data} for the months of a summary that have savings."""
+    return {
+        month_key: {
+            'savings': entry['savings'],
+            'milestone_score': entry['milestone_score'],
+            'donor_contribution': entry.get('donor_contribution', 0.0)
+        }
+        for month_key, entry in sorted(summary.items()) if 'savings' in entry
+    }
+
+
+def rebuild_user_summary(db, user_id, user, as_of):
+    """Rescan a user's subcollections and store the summary with its activity points and compliance score.
+
+    The user's segment change is written in the same batch, from the given user document.
+    """
+    summary = build_summary(db.get_months(user_id, MONTHLY_SAVINGS), db.get_months(user_id, MONTHLY_ACTIVITIES))
+    activity_points, compliance_score = summary_scores(summary, cycle_month_keys(as_of))
+    fields = {SUMMARY: summary, 'activity_points': activity_points, 'compliance_score': compliance_score}
+    batch = db.batch()
+    batch.update_user(user_id, fields)
+    record_segment_changes(batch, [(segment_state(user), segment_state(user, fields))])
+    batch.commit()
+    invalidate_users(user_id)
+    return fields
+
+
+def ensure_summary(db, user_id, user, as_of):
+    """Return the user's summary, building it first for users registered before summaries existed."""
+    if SUMMARY not in user:
+        user.update(rebuild_user_summary(db, user_id, user, as_of))
+    return user[SUMMARY]
+
+
+def record_savings(db, user_id, user, month_key, amount, as_of, update_total=True):
+    """Add savings to a month and update the summary and compliance score.
+
+    Scores are recomputed from the summary over the current cycle, so no subcollection
+    is read and a score left over from an earlier cycle is corrected. The read-modify-write runs in a transaction against a fresh read of the user, so
+    concurrent installments for the same user are never lost.
+    Returns (summary entry, total savings, compliance score).
+    """
+    ensure_summary(db, user_id, user, as_of)
+    entry, total_savings, compliance_score, delta = db.run_transaction(
+        _apply_savings, user_id, month_key, amount, as_of, update_total
+    )
+    invalidate_users(user_id)
+    publish_deltas([delta])
+    return entry, total_savings, compliance_score
+
+
+def _apply_savings(tx, user_id, month_key, amount, as_of, update_total):
+    user = tx.get_user(user_id)
+    if user is None:
+        raise ValueError(f"No user found with unique identifier {user_id}")
+    previous = user[SUMMARY].get(month_key, {'activity': 0})
+    entry = dict(previous)
+    expected_savings = calculate_expected_savings(user['num_children'])
+
+    entry['savings'] = entry.get('savings', 0.0) + amount
+    entry['milestone_score'] = 1 if entry['savings'] >= expected_savings else 0
+    entry.setdefault('donor_contribution', 0.0)
+    month_data = {'savings': entry['savings'], 'milestone_score': entry['milestone_score']}
+    if entry['donor_contribution']:
+        month_data['donor_contribution'] = entry['donor_contribution']
+    tx.set_month(user_id, MONTHLY_SAVINGS, month_key, month_data)
+    append_event(tx, user_id, 'deposit', month_key, amount, in_total=update_total)
+
+    activity_points, compliance_score = summary_scores({**user[SUMMARY], month_key: entry}, cycle_month_keys(as_of))
+    fields = {f"{SUMMARY}.{month_key}": entry, 'activity_points': activity_points, 'compliance_score': compliance_score}
+    total_savings = user['savings']
+    if update_total:
+        total_savings += amount
+        fields['savings'] = total_savings
+    tx.update_user(user_id, fields)
+    record_counters(tx, counter_changes(month_key, deposits=amount, active_mothers=active_in_month(entry) and not active_in_month(previous)))
+    record_segment_changes(tx, [(segment_state(user), segment_state(user, fields))])
+    return entry, total_savings, compliance_score, user_delta(user_id, user, fields)
+
+
+def record_activity(db, user_id, user, month_key, activity, partner, as_of):
+    """Record a month's activity and update the summary, activity points and compliance over the current cycle.
+
+    Returns (activity points, compliance score).
+    """
+    ensure_summary(db, user_id, user, as_of)
+    activity_points, compliance_score, delta = db.run_transaction(
+        _apply_activity, user_id, month_key, activity, partner, as_of
+    )
+    invalidate_users(user_id)
+    publish_deltas([delta])
+    return activity_points, compliance_score
+
+
+def _apply_activity(tx, user_id, month_key, activity, partner, as_of):
+    user = tx.get_user(user_id)
+    if user is None:
+        raise ValueError(f"No user found with unique identifier {user_id}")
+    tx.set_month(user_id, MONTHLY_ACTIVITIES, month_key, {
+        "activity": activity,
+        "partner": partner,
+        "activity_points": 1
+    })
+
+    summary = {**user[SUMMARY], month_key: {**user[SUMMARY].get(month_key, {}), 'activity': 1}}
+    activity_points, compliance_score = summary_scores(summary, cycle_month_keys(as_of))
+    fields = {}
+    if not user[SUMMARY].get(month_key, {}).get('activity', 0):
+        fields[f"{SUMMARY}.{month_key}.activity"] = 1
+    if (activity_points, compliance_score) != (user['activity_points'], user['compliance_score']):
+        fields.update({'activity_points': activity_points, 'compliance_score': compliance_score})
+    if fields:
+        tx.update_user(user_id, fields)
+    previous = user[SUMMARY].get(month_key, {})
+    record_counters(tx, counter_changes(month_key, activities=not previous.get('activity', 0), active_mothers=not active_in_month(previous)))
+    record_segment_changes(tx, [(segment_state(user), segment_state(user, fields))])
+    return activity_points, compliance_score, user_delta(user_id, user, fields)
+
+
+def record_entries(db, user_id, user, deposits, activities, as_of):
+    """Apply many deposits and activities for one user in a single transaction.
+
+    deposits is a list of (month_key, amount) and activities a list of (month_key, activity,
+    partner). Scores are recomputed once from the updated summary rather than per entry.
+    Returns the user's updated monthly savings, total savings, activity points and compliance score.
+    """
+    ensure_summary(db, user_id, user, as_of)
+    result, delta = db.run_transaction(_apply_entries, user_id, deposits, activities, as_of)
+    invalidate_users(user_id)
+    publish_deltas([delta])
+    return result
+
+
+def _apply_entries(tx, user_id, deposits, activities, as_of):
+    user = tx.get_user(user_id)
+    if user is None:
+        raise ValueError(f"No user found with unique identifier {user_id}")
+    summary = user[SUMMARY]
+    expected_savings = calculate_expected_savings(user['num_children'])
+    touched = {}
+
+    for month_key, amount in deposits:
+        entry = touched.setdefault(month_key, dict(summary.get(month_key, {'activity': 0})))
+        entry['savings'] = entry.get('savings', 0.0) + amount
+        entry.setdefault('donor_contribution', 0.0)
+        append_event(tx, user_id, 'deposit', month_key, amount)
+    deposit_months = {month_key for month_key, _ in deposits}
+    for month_key in deposit_months:
+        entry = touched[month_key]
+        entry['milestone_score'] = 1 if entry['savings'] >= expected_savings else 0
+        month_data = {'savings': entry['savings'], 'milestone_score': entry['milestone_score']}
+        if entry['donor_contribution']:
+            month_data['donor_contribution'] = entry['donor_contribution']
+        tx.set_month(user_id, MONTHLY_SAVINGS, month_key, month_data)
+
+    for month_key, activity, partner in activities:
+        tx.set_month(user_id, MONTHLY_ACTIVITIES, month_key, {
+            "activity": activity,
+            "partner": partner,
+            "activity_points": 1
+        })
+        touched.setdefault(month_key, dict(summary.get(month_key, {'activity': 0})))['activity'] = 1
+
+    activity_points, compliance_score = summary_scores({**summary, **touched}, cycle_month_keys(as_of))
+    total_savings = user['savings'] + sum(amount for _, amount in deposits)
+    fields = {f"{SUMMARY}.{month_key}": entry for month_key, entry in touched.items()}
+    fields.update({'savings': total_savings, 'activity_points': activity_points, 'compliance_score': compliance_score})
+    tx.update_user(user_id, fields)
+    record_counters(tx, add_changes(*(
+        counter_changes(
+            month_key,
+            deposits=sum(amount for deposit_month, amount in deposits if deposit_month == month_key),
+            activities=entry.get('activity', 0) and not summary.get(month_key, {}).get('activity', 0),
+            active_mothers=active_in_month(entry) and not active_in_month(summary.get(month_key, {}))
+        )
+        for month_key, entry in touched.items()
+    )))
+    record_segment_changes(tx, [(segment_state(user), segment_state(user, fields))])
+    return {
+        "monthly_savings": {month_key: touched[month_key]['savings'] for month_key in sorted(deposit_months)},
+        "total_savings": total_savings,
+        "activity_points": activity_points,
+        "compliance_score": compliance_score
+    }, user_delta(user_id, user, fields)
+
+
+def rebuild_balances_from_ledger(db, user_id, as_of):
+    """Rewrite a user's savings balances from their ledger (snapshot + tail), then rescore from the summary.
+
+    Months the ledger knows nothing about are left alone, as are activities. The month
+    documents, the user and its segment change are written in one batch. Run it while the
+    user has no deposits in flight; a deposit committed during the rebuild is kept in the
+    ledger and is restored by rebuilding again.
+    Returns the ledger balance that was applied.
+    """
+    user = db.get_user(user_id)
+    if user is None:
+        raise ValueError(f"No user found with unique identifier {user_id}")
+    ensure_summary(db, user_id, user, as_of)
+    balance = ledger_balance(db, user_id)
+    expected_savings = calculate_expected_savings(user['num_children'])
+
+    batch = db.batch()
+    summary = dict(user[SUMMARY])
+    for month_key, month in balance['months'].items():
+        entry = {**summary.get(month_key, {'activity': 0}), **month}
+        entry['milestone_score'] = 1 if month['savings'] >= expected_savings else 0
+        summary[month_key] = entry
+        month_data = {'savings': month['savings'], 'milestone_score': entry['milestone_score']}
+        if month['donor_contribution']:
+            month_data['donor_contribution'] = month['donor_contribution']
+        batch.set_month(user_id, MONTHLY_SAVINGS, month_key, month_data)
+
+    activity_points, compliance_score = summary_scores(summary, cycle_month_keys(as_of))
+    fields = {
+        SUMMARY: summary, 'savings': balance['savings'], 'donor_contributions': balance['donor_contributions'],
+        'activity_points': activity_points, 'compliance_score': compliance_score
+    }
+    batch.update_user(user_id, fields)
+    record_segment_changes(batch, [(segment_state(user), segment_state(user, fields))])
+    batch.commit()
+    invalidate_users(user_id)
+    publish_deltas([user_delta(user_id, user, fields)])
+    return balance
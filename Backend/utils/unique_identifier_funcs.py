@@ -1,16 +1,23 @@
 import hashlib
 import re
 
+_NON_MOBILE_CHARS = re.compile(r'[^\d+]')
+_MOBILE = re.compile(r'\+256[0-9]{9}')
+_AGES = re.compile(r',*[+-]?\d+(?:,+[+-]?\d+)*,*')  # Ages after / and spaces are turned into commas
+_AGE = r'(?:\+?0*(?:1[0-8]|[0-9])|-0+)'  # One age from 0 to 18, as int() would read it
+_AGES_IN_RANGE = re.compile(rf',*{_AGE}(?:,+{_AGE})*,*')
+MIN_CHILD_AGE, MAX_CHILD_AGE = 0, 18
+
 def normalize_mobile_number(mobile):
     """Normalize mobile number to +256XXXXXXXXX format."""
     mobile = str(mobile).strip()
     # Remove any non-digit characters except the leading +
-    mobile = re.sub(r'[^\d+]', '', mobile)
+    mobile = _NON_MOBILE_CHARS.sub('', mobile)
     # If missing +256, add it if the number has 9 digits
     if not mobile.startswith('+256') and len(mobile) == 9:
         mobile = '+256' + mobile
     # Validate format
-    if not re.match(r'^\+256[0-9]{9}$', mobile):
+    if not _MOBILE.fullmatch(mobile):
         raise ValueError(f"Invalid mobile number format: {mobile}")
     return mobile
 
@@ -18,10 +25,10 @@ def parse_children_ages(ages_str):
     """Parse ages string (e.g., '16/9/6', '4/1', '1') into a list of integers."""
     if not ages_str:
         return []
-    
+
     # Ensure input is treated as string and remove any datetime-like artifacts
     ages_str = str(ages_str).strip()
-    
+
     # Handle different separators (/, ,, or none)
     ages_str = ages_str.replace('/', ',').replace(' ', '')
     try:
@@ -29,30 +36,75 @@ def parse_children_ages(ages_str):
         ages = [int(age) for age in ages_str.split(',') if age]
         if not ages:
             raise ValueError("No valid ages found")
-        if not all(0 <= age <= 18 for age in ages):
+        if not all(MIN_CHILD_AGE <= age <= MAX_CHILD_AGE for age in ages):
             raise ValueError("Children ages must be between 0 and 18")
         return ages
     except ValueError as e:
         raise ValueError(f"Invalid children ages format: {ages_str} ({str(e)})")
 
+def format_unique_identifier(first_name, surname, mobile_normalized, num_children, ages):
+    """Build the identifier from already-validated fields (a normalized mobile and parsed ages)."""
+    mobile_digits = mobile_normalized.replace('+256', '')
+    ages_str = ''.join(str(age) for age in ages)
+    return f"{first_name[0].upper()}{surname[0].upper()}{mobile_digits}{int(num_children)}{ages_str}"
+
 def generate_unique_identifier(first_name, surname, mobile, num_children, children_ages):
     """Generate a secure, unique identifier."""
     if not first_name or not surname:
         raise ValueError("First name and surname are required")
-    
-    # Normalize inputs
-    first_initial = first_name[0].upper()
-    last_initial = surname[0].upper()
-    mobile_normalized = normalize_mobile_number(mobile)
-    mobile_digits = mobile_normalized.replace('+256', '')
-    num_children = int(num_children)
-    ages = parse_children_ages(children_ages)
-    ages_str = ''.join(str(age) for age in ages)
-    
-    # Create raw string
-    raw = f"{first_initial}{last_initial}{mobile_digits}{num_children}{ages_str}"
-    
-    # Format identifier to match sample IDs (no hash for exact match)
-    identifier = f"{first_initial}{last_initial}{mobile_digits}{num_children}{ages_str}"
-    
-    return identifier
\ No newline at end of file
+
+    # Normalize inputs, then format identifier to match sample IDs (no hash for exact match)
+    return format_unique_identifier(
+        first_name, surname, normalize_mobile_number(mobile), num_children, parse_children_ages(children_ages)
+    )
+
+def normalize_mobile_numbers(mobiles):
+    """Batch normalize_mobile_number over a pandas Series.
+
+    Returns (numbers, invalid): the +256XXXXXXXXX numbers, and a boolean mask of rows that
+    failed validation, whose numbers hold the cleaned input for the error message.
+    """
+    import pandas as pd  # Only batch paths (sheet import, benchmarks) need pandas
+
+    # Pattern strings (not compiled patterns) let Arrow-backed string columns run the regex natively
+    mobiles = pd.Series(mobiles, dtype=object).fillna('').astype(str).str.strip().str.replace(_NON_MOBILE_CHARS.pattern, '', regex=True)
+    local = (mobiles.str.len() == 9) & ~mobiles.str.startswith('+256')
+    mobiles = mobiles.mask(local, '+256' + mobiles)
+    return mobiles, ~mobiles.str.fullmatch(_MOBILE.pattern).astype(bool)
+
+def parse_children_ages_batch(ages):
+    """Batch parse_children_ages over a pandas Series.
+
+    Returns (ages, errors): each valid row's ages in canonical comma-separated form
+    ('16,9,6', '' for a blank cell; turn one into a list with parse_children_ages), and
+    the error message of each row that failed (missing where it parsed).
+    """
+    import pandas as pd
+
+    raw = pd.Series(ages, dtype=object).fillna('').astype(str)
+    cleaned = raw.str.strip().str.replace('/', ',', regex=False).str.replace(' ', '', regex=False)
+    blank = raw == ''
+    errors = pd.Series(None, index=raw.index, dtype=object)
+
+    malformed = ~blank & ~cleaned.str.fullmatch(_AGES.pattern).astype(bool)
+    out_of_range = ~blank & ~malformed & ~cleaned.str.fullmatch(_AGES_IN_RANGE.pattern).astype(bool)
+    errors[malformed] = "Invalid children ages format: " + cleaned[malformed] + " (ages must be whole numbers)"
+    errors[out_of_range] = "Invalid children ages format: " + cleaned[out_of_range] + " (Children ages must be between 0 and 18)"
+
+    # Rewrite valid ages as int() reads them: no signs (only -0 passes), empty items or leading zeros
+    canonical = (
+        cleaned.str.replace(r'[+-]', '', regex=True).str.replace(r',+', ',', regex=True).str.strip(',')
+        .str.replace(r'(^|,)0+(\d)', r'\1\2', regex=True)
+    )
+    return canonical.mask(errors.notna()), errors
+
+def count_children_ages(ages):
+    """Return how many ages each canonical ages string from parse_children_ages_batch holds."""
+    return (ages.str.count(',') + 1).where(ages != '', 0)
+
+def generate_unique_identifiers(first_names, surnames, mobiles, num_children, ages):
+    """Batch format_unique_identifier over validated pandas Series (normalized mobiles, canonical ages)."""
+    return (
+        first_names.str[0].str.upper() + surnames.str[0].str.upper() + mobiles.str.slice(4)
+        + num_children.astype(int).astype(str) + ages.str.replace(',', '', regex=False)
+    )
@@ -0,0 +1,158 @@
+import hashlib
+import itertools
+import json
+import os
+import threading
+from utils.cache import TTLCache
+
+USER_CACHE_TTL = float(os.getenv("CARIYA_USER_CACHE_TTL", "60"))
+USER_CACHE_SIZE = int(os.getenv("CARIYA_USER_CACHE_SIZE", "20000"))
+
+
+class MemoryCacheBackend:
+    """Per-process LRU/TTL backend; each uvicorn worker keeps its own copy.
+
+    An invalidation only reaches the worker that made the write: other workers serve
+    their copy until it expires.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.generations = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.next_generation = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def generation(self, key):
+        return self.generations.get(key)
+
+    def set(self, key, value, generation):
+        with self.lock:
+            if self.generations.get(key) == generation:
+                self.cache.set(key, value)
+
+    def invalidate(self, key):
+        with self.lock:
+            self.generations.set(key, next(self.next_generation))  # Never reused, even after an entry expires
+            self.cache.delete(key)
+
+
+class RedisCacheBackend:
+    """Backend shared by all workers through Redis (or any server speaking its protocol)."""
+
+    def __init__(self, url, ttl):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.ttl = int(ttl)
+        self.watch_error = redis.WatchError
+
+    def get(self, key):
+        value = self.client.get(f"cariya:user:{key}")
+        return value.decode() if value is not None else None
+
+    def generation(self, key):
+        return self.client.get(f"cariya:user-generation:{key}")
+
+    def set(self, key, value, generation):
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(f"cariya:user-generation:{key}")
+                if pipe.get(f"cariya:user-generation:{key}") != generation:
+                    return
+                pipe.multi()
+                pipe.set(f"cariya:user:{key}", value, ex=self.ttl)
+                pipe.execute()
+            except self.watch_error:
+                pass  # Invalidated while the fill was being written
+
+    def invalidate(self, key):
+        with self.client.pipeline() as pipe:
+            pipe.incr(f"cariya:user-generation:{key}")
+            pipe.expire(f"cariya:user-generation:{key}", self.ttl)
+            pipe.delete(f"cariya:user:{key}")
+            pipe.execute()
+
+
+class UserCache:
+    """Read-through cache of user documents, keyed by user id, with hit/miss counters.
+
+    Entries are stored as JSON so every reader gets its own copy, and the ETag of a
+    user is the hash of that JSON. Each invalidation bumps the user's generation, and a
+    miss stores what it read only if the generation has not moved since before the read,
+    so a document read just before a write commits is not cached over the invalidation.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get_user(self, db, user_id):
+        """Return (user, etag), reading the store only on a miss; (None, None) if the user does not exist."""
+        raw = self.backend.get(user_id)
+        if raw is None:
+            self._count('misses')
+            generation = self.backend.generation(user_id)
+            user = db.get_user(user_id)
+            if user is None:
+                return None, None
+            raw = json.dumps(user, sort_keys=True, default=str)
+            self.backend.set(user_id, raw, generation)
+        else:
+            self._count('hits')
+        return json.loads(raw), f'"{hashlib.sha1(raw.encode()).hexdigest()}"'
+
+    def invalidate(self, *user_ids):
+        """Drop cached users after their documents change."""
+        for user_id in user_ids:
+            self.backend.invalidate(user_id)
+        with self._lock:
+            self.invalidations += len(user_ids)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+def create_user_cache():
+    """Build the cache selected by CARIYA_CACHE_BACKEND ('memory' by default, or 'redis' with CARIYA_REDIS_URL)."""
+    backend = os.getenv("CARIYA_CACHE_BACKEND", "memory")
+    if backend == "memory":
+        return UserCache(MemoryCacheBackend(USER_CACHE_SIZE, USER_CACHE_TTL))
+    if backend == "redis":
+        return UserCache(RedisCacheBackend(os.getenv("CARIYA_REDIS_URL", "redis://localhost:6379/0"), USER_CACHE_TTL))
+    raise ValueError(f"Unknown cache backend: {backend}")
+
+
+user_cache = create_user_cache()
+
+
+def get_cached_user(db, user_id):
+    """Return (user, etag) through the shared user cache."""
+    return user_cache.get_user(db, user_id)
+
+
+def view_etag(etag, *inputs):
+    """Return the ETag of a response computed from a user and other inputs, e.g. the month it is as of."""
+    key = json.dumps([etag, *inputs], sort_keys=True, default=str)
+    return f'"{hashlib.sha1(key.encode()).hexdigest()}"'
+
+
+def invalidate_users(*user_ids):
+    """Invalidate cached users from a write path."""
+    user_cache.invalidate(*user_ids)
@@ -1,4 +1,4 @@
-import React, { useState, useEffect, useCallback } from 'react';
+import React, { useState, useEffect, useCallback, useRef } from 'react';
 import { StyleSheet, View, Text, Dimensions, Animated, ActivityIndicator, TouchableOpacity, Image } from 'react-native';
 import { Card, Button } from 'react-native-paper';
 import Icon from 'react-native-vector-icons/MaterialIcons';
@@ -8,6 +8,7 @@ import { PanGestureHandler, State } from 'react-native-gesture-handler';
 import { useSharedValue, useAnimatedStyle, withSpring } from 'react-native-reanimated';
 import * as Haptics from 'expo-haptics';
 import axios from 'axios';
+import { fetch as streamingFetch } from 'expo/fetch';
 
 // Get dimensions for responsive design
 const { width, height } = Dimensions.get('window');
@@ -16,6 +17,8 @@ const fontScale = width < 320 ? 0.8 : 1;
 const paddingScale = isSmallScreen ? 0.75 : 1;
 
 const API_URL = 'http://0.0.0.0:8080';
+const PAGE_SIZE = 20;
+const STREAM_RETRY_MS = 5000;
 
 // Placeholder image URLs for cycling
 const placeholderImages = [
@@ -33,12 +36,37 @@ const bioSnippets = [
   'Advocate for children’s future',
 ];
 
+// Fold a delta from /donor-view/stream into a donor row (it only carries the fields that changed)
+const applyDelta = (donor, delta) => {
+  const monthly_data = { ...donor.monthly_data, ...(delta.monthly_data || {}) };
+  const total_user_savings = Object.values(monthly_data).reduce((sum, month) => sum + month.user_savings, 0);
+  return { ...donor, ...delta, monthly_data, total_user_savings };
+};
+
+// Parse one Server-Sent Events message into { id, event, data }; null for keepalive comments
+const parseEvent = (chunk) => {
+  const message = { event: 'message', data: '' };
+  chunk.split('\n').forEach((line) => {
+    const separator = line.indexOf(':');
+    if (separator <= 0) return;
+    const field = line.slice(0, separator);
+    const value = line.slice(separator + 1).trimStart();
+    if (field === 'data') message.data += value;
+    else message[field] = value;
+  });
+  return message.id === undefined && !message.data ? null : message;
+};
+
 const DonorViewScreen = ({ navigation }) => {
   const [donors, setDonors] = useState([]);
   const [matches, setMatches] = useState([]);
   const [currentIndex, setCurrentIndex] = useState(0);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [streamFrom, setStreamFrom] = useState(null);
+  const lastEventId = useRef(null);
 
   // Animation for swipe feedback
   const translateX = useSharedValue(0);
@@ -55,17 +83,23 @@ const DonorViewScreen = ({ navigation }) => {
     opacity: opacity.value,
   }));
 
-  // Fetch donors
+  // Enrich a page of donors, continuing the image/bio cycle from the given offset
+  const enrich = (page, offset) =>
+    (page || []).map((donor, index) => ({
+      ...donor,
+      profile_image: placeholderImages[(offset + index) % placeholderImages.length],
+      bio: bioSnippets[(offset + index) % bioSnippets.length],
+    }));
+
+  // Fetch the first page of donors
   const fetchDonors = useCallback(async () => {
     try {
       setLoading(true);
-      const response = await axios.get(`${API_URL}/donor-view`);
-      const enrichedData = response.data.donor_view.map((donor, index) => ({
-        ...donor,
-        profile_image: placeholderImages[index % placeholderImages.length],
-        bio: bioSnippets[index % bioSnippets.length],
-      }));
-      setDonors(enrichedData || []);
+      const response = await axios.get(`${API_URL}/donor-view`, { params: { limit: PAGE_SIZE } });
+      setDonors(enrich(response.data.donor_view, 0));
+      setNextCursor(response.data.next_cursor || null);
+      setStreamFrom(response.data.last_event_id || null);
+      setCurrentIndex(0);
       setLoading(false);
       setError(null);
     } catch (err) {
@@ -75,10 +109,81 @@ const DonorViewScreen = ({ navigation }) => {
     }
   }, []);
 
+  // Append the next page when the donor nears the end of the deck
+  const fetchMoreDonors = useCallback(async () => {
+    if (!nextCursor || loadingMore) return;
+    try {
+      setLoadingMore(true);
+      const response = await axios.get(`${API_URL}/donor-view`, {
+        params: { limit: PAGE_SIZE, start_after: nextCursor },
+      });
+      setDonors((prev) => [...prev, ...enrich(response.data.donor_view, prev.length)]);
+      setNextCursor(response.data.next_cursor || null);
+    } catch (err) {
+      console.error('Error fetching more donors:', err);
+    } finally {
+      setLoadingMore(false);
+    }
+  }, [nextCursor, loadingMore]);
+
+  useEffect(() => {
+    if (donors.length - currentIndex <= 3) {
+      fetchMoreDonors();
+    }
+  }, [currentIndex, donors.length, fetchMoreDonors]);
+
   useEffect(() => {
     fetchDonors();
   }, [fetchDonors]);
 
+  // Keep loaded donors live: apply the per-user changes streamed since the first page was read
+  useEffect(() => {
+    if (!streamFrom) return undefined;
+    lastEventId.current = streamFrom;
+    const controller = new AbortController();
+    let retryTimer = null;
+
+    const handleEvent = (message) => {
+      if (message.id) lastEventId.current = message.id;
+      if (message.event === 'reset') {
+        fetchDonors(); // The stream carries on from the reset's id
+      } else if (message.event === 'deltas') {
+        const deltas = new Map(JSON.parse(message.data).map((delta) => [delta.user_id, delta]));
+        setDonors((prev) => prev.map((donor) => (deltas.has(donor.user_id) ? applyDelta(donor, deltas.get(donor.user_id)) : donor)));
+      }
+    };
+
+    const connect = async () => {
+      try {
+        const response = await streamingFetch(`${API_URL}/donor-view/stream`, {
+          headers: { Accept: 'text/event-stream', 'Last-Event-ID': lastEventId.current },
+          signal: controller.signal,
+        });
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        for (;;) {
+          const { value, done } = await reader.read();
+          if (done) break;
+          buffer += decoder.decode(value, { stream: true });
+          const messages = buffer.split('\n\n');
+          buffer = messages.pop();
+          messages.map(parseEvent).filter(Boolean).forEach(handleEvent);
+        }
+      } catch (err) {
+        if (controller.signal.aborted) return;
+        console.error('Donor stream interrupted:', err);
+      }
+      if (!controller.signal.aborted) retryTimer = setTimeout(connect, STREAM_RETRY_MS);
+    };
+
+    connect();
+    return () => {
+      controller.abort();
+      clearTimeout(retryTimer);
+    };
+  }, [streamFrom, fetchDonors]);
+
   // Handle swipe actions
   const onSwipedLeft = () => {
     setCurrentIndex((prev) => prev + 1);
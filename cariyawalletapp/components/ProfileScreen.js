@@ -31,10 +31,13 @@ const ProfileScreen = ({ route, navigation }) => {
     const fetchUserData = async () => {
       try {
         setIsLoading(true);
-        const userResponse = await axios.get(`${API_URL}/users/${unique_id}`);
-        const complianceResponse = await axios.get(`${API_URL}/users/${unique_id}/compliance`);
-        setUser(userResponse.data);
-        setComplianceDetail(complianceResponse.data);
+        const response = await axios.get(`${API_URL}/users/${unique_id}/dashboard`, {
+          params: {
+            fields: 'first_name,surname,total_savings,activity_points,compliance_score,num_children,ages_of_children_per_birth_order',
+          },
+        });
+        setUser(response.data);
+        setComplianceDetail({ compliance_score: response.data.compliance_score });
       } catch (error) {
         console.log('Error fetching profile:', error);
         // Keep dummy data if fetch fails
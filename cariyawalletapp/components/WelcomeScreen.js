@@ -106,10 +106,11 @@ const WelcomeScreen = ({ navigation }) => {
     const fetchStats = async () => {
       setLoading(true);
       try {
-        const response = await axios.get(`${API_URL}/donor-view`);
+        // Programme totals come from the server's counters, not from summing donor-view rows
+        const response = await axios.get(`${API_URL}/stats`);
         setStats({
-          users: response.data.donor_view.length,
-          donations: response.data.donor_view.reduce((sum, d) => sum + d.total_donor_contributions, 0),
+          users: response.data.mothers,
+          donations: response.data.total_donor_contributions,
         });
         setLoading(false);
       } catch (error) {